@@ -0,0 +1,162 @@
+import os
+import sys
+import json
+import re
+import pickle
+import hashlib
+
+from metrics import metrics
+
+# À incrémenter quand le contenu des artefacts change (nouvel algorithme, nouveau format)
+CACHE_VERSION = 1
+
+# Fichier d'index des empreintes : évite de relire un fichier dont la taille et mtime n'ont pas changé
+FINGERPRINTS_FILE = "fingerprints.json"
+
+# Noms des fichiers d'entrée ("{kind}-{key}{suffix}", voir ArtifactCache.path) : seuls candidats à l'éviction
+_ENTRY_NAME = re.compile(r"^\w+-[0-9a-f]{32}\.\w+$")
+
+def _canonical(value):
+    """Rend sérialisable en JSON, de façon déterministe, les paramètres d'un artefact."""
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    if isinstance(value, tuple):
+        return list(value)
+    return repr(value)
+
+def _atomic_write(path, data):
+    """Écrit data dans path via un fichier temporaire renommé, pour ne jamais laisser d'entrée à moitié écrite."""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+class ArtifactCache:
+    """
+    Cache d'artefacts adressé par contenu : la clé d'une entrée dépend de
+    l'empreinte (hachage du contenu) de ses fichiers d'entrée et de tous ses
+    paramètres, donc un corpus modifié ne renvoie jamais un artefact périmé.
+    Les écritures sont atomiques, les entrées portent CACHE_VERSION et les
+    moins récemment utilisées sont supprimées au-delà de max_bytes.
+    """
+
+    def __init__(self, directory="cache", max_bytes=1 << 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._fingerprints_path = os.path.join(directory, FINGERPRINTS_FILE)
+        try:
+            with open(self._fingerprints_path, 'r', encoding='utf-8') as f:
+                self._fingerprints = json.load(f)
+        except (OSError, ValueError):
+            self._fingerprints = {}
+
+    def fingerprint(self, path):
+        """Hachage du contenu d'un fichier, recalculé seulement si sa taille ou son mtime a changé."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        known = self._fingerprints.get(path)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        self._fingerprints[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        _atomic_write(self._fingerprints_path, json.dumps(self._fingerprints).encode("utf-8"))
+        return digest.hexdigest()
+
+    def key(self, kind, inputs=(), **params):
+        """Clé d'un artefact : type, version, empreinte des fichiers d'entrée et paramètres."""
+        description = {
+            "kind": kind,
+            "version": CACHE_VERSION,
+            "inputs": sorted(self.fingerprint(path) for path in inputs),
+            "params": params,
+        }
+        encoded = json.dumps(description, sort_keys=True, default=_canonical).encode("utf-8")
+        return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+    def path(self, kind, key, suffix=".pkl"):
+        """Chemin du fichier d'une entrée (pour les artefacts écrits directement, comme les modèles)."""
+        return os.path.join(self.directory, f"{kind}-{key}{suffix}")
+
+    def record(self, kind, hit):
+        """Comptabilise une réussite ou un échec du cache pour un type d'artefact."""
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        metrics.increment("artifact_cache_requests_total", kind=kind, result="hit" if hit else "miss")
+
+    def get(self, kind, key):
+        """Renvoie (True, valeur) si l'entrée existe et est lisible, (False, None) sinon."""
+        path = self.path(kind, key)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            self.record(kind, False)
+            return False, None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as error:
+            print(f"Entrée de cache illisible ignorée ({path}) : {error}", file=sys.stderr)
+            self.discard(path)
+            self.record(kind, False)
+            return False, None
+
+        if not isinstance(entry, dict) or entry.get("version") != CACHE_VERSION or entry.get("key") != key:
+            self.discard(path)
+            self.record(kind, False)
+            return False, None
+
+        self.touch(path)
+        self.record(kind, True)
+        return True, entry["value"]
+
+    def put(self, kind, key, value):
+        """Enregistre une valeur (sérialisée avec pickle) puis applique la limite de taille."""
+        entry = {"version": CACHE_VERSION, "key": key, "value": value}
+        path = self.path(kind, key)
+        _atomic_write(path, pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+        self.evict(keep=path)
+
+    def touch(self, path):
+        """Marque une entrée comme récemment utilisée (l'éviction se base sur mtime)."""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def discard(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self, keep=None):
+        """
+        Supprime les entrées les moins récemment utilisées tant que le cache
+        dépasse max_bytes. Seuls les fichiers nommés comme des entrées sont
+        concernés (pas les autres fichiers du répertoire), et jamais keep,
+        l'entrée qui vient d'être écrite, même si elle dépasse seule la limite.
+        """
+        keep = os.path.basename(keep) if keep else None
+        entries = []
+        for name in os.listdir(self.directory):
+            if not _ENTRY_NAME.match(name) or name == keep:
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.discard(os.path.join(self.directory, name))
+            total -= size
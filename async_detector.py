@@ -0,0 +1,182 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from language_detection3 import score_sentences, top_languages, fork_executor, worker_state
+from metrics import metrics
+
+def _score_in_process(phrases):
+    """Scores d'un lot dans un processus de l'exécuteur, avec les mesures faites pour le renvoyer."""
+    scores = score_sentences(phrases, worker_state["model"], worker_state["n"])
+    return scores, metrics.drain() if metrics.enabled else None
+
+class AsyncDetector:
+    """
+    Façade asyncio du détecteur. Les appels concurrents à detect sont regroupés
+    en micro-lots : la première requête arrivée attend au plus max_delay
+    secondes que d'autres la rejoignent (dans la limite de max_batch phrases),
+    puis le lot est évalué dans un exécuteur (thread ou processus) pour ne
+    pas bloquer la boucle d'événements. Jusqu'à workers lots sont évalués en
+    même temps ; pendant ce temps, les requêtes suivantes forment le lot suivant.
+
+    La file d'attente est bornée à max_queue requêtes : au-delà, detect attend
+    qu'une place se libère (contre-pression). Une requête annulée avant
+    l'évaluation de son lot en est retirée ; annulée pendant, son résultat est ignoré.
+
+    S'utilise avec « async with AsyncDetector(model, n) as detector: ».
+    """
+
+    def __init__(self, model, n, max_batch=256, max_delay=0.002, max_queue=1024, executor="thread", workers=1):
+        self.model = model
+        self.n = n
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.executor = executor
+        self.workers = workers
+        self.queue = None
+        self.task = None
+        self._slots = None
+        self._batches = set()
+        self._executor = None
+        self._own_executor = False
+
+    def _create_executor(self):
+        if self.executor == "thread":
+            return ThreadPoolExecutor(self.workers), True
+        if self.executor == "process":
+            return fork_executor(self.workers, model=self.model, n=self.n), True
+        # Exécuteur fourni par l'appelant (qui reste chargé de le fermer)
+        return self.executor, False
+
+    def start(self):
+        self.queue = asyncio.Queue(self.max_queue)
+        self._slots = asyncio.Semaphore(self.workers)
+        self._executor, self._own_executor = self._create_executor()
+        self.task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Arrête la boucle de regroupement ; les requêtes encore en attente sont annulées."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        for batch in list(self._batches):
+            batch.cancel()
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+        while self.queue is not None and not self.queue.empty():
+            _, _, future = self.queue.get_nowait()
+            future.cancel()
+        if self._own_executor:
+            # Attendre la fin des processus sans bloquer la boucle d'événements
+            await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(self._executor.shutdown, wait=True, cancel_futures=True))
+        self._executor = None
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def scores(self, phrases):
+        """Similarités cosinus (phrases x langues), comme score_sentences."""
+        return await self._submit(list(phrases), None)
+
+    async def detect(self, phrases, k=3):
+        """Renvoie les k meilleures langues (langue, score) de chaque phrase."""
+        return await self._submit(list(phrases), k)
+
+    async def detect_language(self, phrase):
+        """Langue la plus probable d'une phrase."""
+        ranked = await self._submit([phrase], 1)
+        return ranked[0][0][0] if ranked[0] else None
+
+    async def _submit(self, phrases, k):
+        if self.task is None:
+            raise RuntimeError("AsyncDetector n'est pas démarré (utiliser start() ou async with)")
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((phrases, k, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            # Attendre qu'un exécuteur se libère : pendant ce temps les requêtes s'accumulent dans la file
+            await self._slots.acquire()
+            try:
+                requests = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            batch = asyncio.ensure_future(self._evaluate(requests))
+            self._batches.add(batch)
+            batch.add_done_callback(self._batches.discard)
+
+    async def _collect(self):
+        """Forme un micro-lot : la première requête, puis celles arrivées avant l'échéance."""
+        loop = asyncio.get_running_loop()
+        requests = [await self.queue.get()]
+        size = len(requests[0][0])
+        deadline = loop.time() + self.max_delay
+
+        # Attendre d'autres requêtes jusqu'à l'échéance ou jusqu'à remplir le lot
+        while size < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            requests.append(request)
+            size += len(request[0])
+        return requests
+
+    async def _evaluate(self, requests):
+        """Évalue un micro-lot dans l'exécuteur et répond à ses requêtes, puis libère sa place."""
+        loop = asyncio.get_running_loop()
+        try:
+            # Les requêtes annulées entre-temps ne sont pas évaluées
+            requests = [request for request in requests if not request[2].done()]
+            phrases = [phrase for request_phrases, _, _ in requests for phrase in request_phrases]
+            metrics.increment("micro_batches_total")
+            if not phrases:
+                for _, k, future in requests:
+                    future.set_result([] if k is not None else np.zeros((0, len(self.model.languages))))
+                return
+
+            try:
+                if self.executor == "process":
+                    scores, worker_metrics = await loop.run_in_executor(self._executor, _score_in_process, phrases)
+                    metrics.merge(worker_metrics)
+                else:
+                    scores = await loop.run_in_executor(self._executor, score_sentences, phrases, self.model, self.n)
+            except asyncio.CancelledError:
+                for _, _, future in requests:
+                    future.cancel()
+                raise
+            except Exception as error:
+                for _, _, future in requests:
+                    if not future.done():
+                        future.set_exception(error)
+                return
+
+            start = 0
+            for request_phrases, k, future in requests:
+                end = start + len(request_phrases)
+                if not future.done():
+                    if k is None:
+                        future.set_result(scores[start:end])
+                    else:
+                        future.set_result(top_languages(scores[start:end], self.model.languages, k)
+                                          if end > start else [])
+                start = end
+        finally:
+            self._slots.release()
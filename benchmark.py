@@ -0,0 +1,280 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import resource
+import multiprocessing
+
+import numpy as np
+
+import language_detection3
+from language_detection3 import load_model, detect_language, detect_languages
+from train import train
+
+# Métriques pour lesquelles une valeur plus grande est meilleure (les autres : plus petite)
+HIGHER_IS_BETTER = ("throughput",)
+
+def generate_corpus(path, languages=8, vocabulary=300, sentences=3000, seed=0):
+    """
+    Écrit dans path un corpus synthétique "phrase\\tlangue" : chaque langue a son
+    alphabet, son vocabulaire et une chaîne de Markov sur les mots, pour que les
+    n-grammes se répètent comme dans une vraie langue. Renvoie le générateur de
+    phrases generate(langue, nombre_de_mots, rng) pour fabriquer les phrases de test.
+    """
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyzéèàùçñüöß"
+    models = {}
+    for index in range(languages):
+        alphabet = rng.sample(letters, 12)
+        words = ["".join(rng.choice(alphabet) for _ in range(rng.randint(2, 9))) for _ in range(vocabulary)]
+        models[f"l{index:02d}"] = (words, {word: rng.sample(words, 4) for word in words})
+
+    def generate(language, length, rng):
+        words, successors = models[language]
+        word = rng.choice(words)
+        phrase = [word]
+        for _ in range(length - 1):
+            word = rng.choice(successors[word])
+            phrase.append(word)
+        return " ".join(phrase)
+
+    with open(path, 'w', encoding='utf-8') as file:
+        for language in models:
+            for _ in range(sentences):
+                file.write(f"{generate(language, rng.randint(3, 20), rng)}\t{language}\n")
+    return list(models), generate
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus courant, en Mo."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sous macOS, en kilo-octets ailleurs
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _isolated(connection, func, args):
+    try:
+        baseline = peak_rss_mb()
+        result = func(*args)
+        connection.send((None, (result, peak_rss_mb(), baseline)))
+    except BaseException as error:
+        # L'exception est relancée dans le processus principal (sous forme de texte si elle ne se sérialise pas)
+        try:
+            connection.send((error, None))
+        except Exception:
+            connection.send((RuntimeError(f"{type(error).__name__}: {error}"), None))
+    finally:
+        connection.close()
+
+def run_isolated(func, *args):
+    """
+    Exécute func(*args) dans un nouveau processus (spawn) pour mesurer son pic
+    de mémoire sans celle du processus courant. Renvoie (résultat, pic, pic avant l'appel).
+    Une exception levée par func est relancée ici ; si le processus meurt sans
+    répondre (mémoire épuisée, signal), RuntimeError indique son code de sortie.
+    """
+    context = multiprocessing.get_context("spawn")
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(target=_isolated, args=(child, func, args))
+    process.start()
+    # Sans cette copie de l'extrémité d'écriture, recv() attendrait indéfiniment un processus mort
+    child.close()
+    try:
+        error, result = parent.recv()
+    except EOFError:
+        process.join()
+        raise RuntimeError(f"{func.__name__} s'est terminé sans résultat (code de sortie {process.exitcode})") from None
+    finally:
+        parent.close()
+    process.join()
+    if error is not None:
+        raise error
+    return result
+
+def measure_load(model_path, mmap):
+    """Temps de chargement du modèle (ms)."""
+    start_time = time.perf_counter()
+    load_model(model_path, mmap=mmap)
+    return (time.perf_counter() - start_time) * 1000
+
+def measure_batch(model_path, phrases, batch_size, repeats=1, min_time=0.2):
+    """
+    Temps de classement des phrases par lots (s), modèle chargé non compris.
+    Après un passage d'échauffement, chacune des repeats mesures enchaîne des
+    passages pendant au moins min_time secondes (comme timeit) ; la durée
+    médiane d'un passage est renvoyée. Le cache du prétraitement est vidé
+    avant chaque passage pour ne pas mesurer des phrases déjà nettoyées.
+    """
+    model = load_model(model_path)
+
+    def run():
+        clear = getattr(language_detection3.preprocess_text_cached, "cache_clear", None)
+        passes = 0
+        elapsed = 0.0
+        while passes == 0 or elapsed < min_time:
+            if clear is not None:
+                clear()
+            start_time = time.perf_counter()
+            for i in range(0, len(phrases), batch_size):
+                detect_languages(phrases[i:i + batch_size], model, model.n)
+            elapsed += time.perf_counter() - start_time
+            passes += 1
+        return elapsed / passes
+
+    run()  # Échauffement : pages du modèle, caches et imports paresseux
+    return float(np.median([run() for _ in range(repeats)]))
+
+def measure_latency(model, phrases):
+    """Latence de chaque appel à detect_language (ms)."""
+    latencies = []
+    for phrase in phrases:
+        start_time = time.perf_counter()
+        detect_language(phrase, model, model.n)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    return latencies
+
+def median_of(values):
+    """Médiane, élément par élément, de mesures répétées (nombres ou tuples de nombres)."""
+    values = np.asarray(values, dtype=np.float64)
+    medians = np.median(values, axis=0)
+    return float(medians) if medians.ndim == 0 else [float(value) for value in medians]
+
+def run_benchmark(languages=8, sentences=3000, lengths=(3, 10, 30, 100), count=2000,
+                  batch_size=50, seed=0, features=None, repeats=5):
+    """
+    Exécute toutes les mesures et renvoie un dictionnaire sérialisable en JSON.
+    Chaque métrique est la médiane de repeats mesures.
+    """
+    rng = random.Random(seed + 1)
+    results = {
+        "config": {"languages": languages, "sentences": sentences, "lengths": list(lengths),
+                   "count": count, "batch_size": batch_size, "seed": seed, "features": features,
+                   "repeats": repeats},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count()},
+        "metrics": {},
+    }
+    metrics = results["metrics"]
+
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as temp_dir:
+        corpus_path = os.path.join(temp_dir, "train.txt")
+        model_path = os.path.join(temp_dir, "model.bin")
+        language_names, generate = generate_corpus(corpus_path, languages, sentences=sentences, seed=seed)
+
+        train_times = []
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            train(corpus_path, model_path, features=features)
+            train_times.append(time.perf_counter() - start_time)
+        metrics["train_s"] = median_of(train_times)
+
+        # Chargement à froid, chaque fois dans un processus neuf
+        load_ms, load_peak, baseline = median_of([run_isolated(measure_load, model_path, False)
+                                                  for _ in range(repeats)])
+        load_mmap_ms, mmap_peak, _ = median_of([run_isolated(measure_load, model_path, True)
+                                                for _ in range(repeats)])
+        metrics["load_ms"] = load_ms
+        metrics["load_mmap_ms"] = load_mmap_ms
+        metrics["peak_rss_mb"] = {"baseline": baseline, "load": load_peak, "load_mmap": mmap_peak}
+        metrics["model_size_mb"] = os.path.getsize(model_path) / (1024 * 1024)
+
+        # Débit (phrases/s) selon la longueur des phrases
+        metrics["throughput"] = {}
+        for length in lengths:
+            phrases = [generate(rng.choice(language_names), length, rng) for _ in range(count)]
+            elapsed, batch_peak, _ = run_isolated(measure_batch, model_path, phrases, batch_size, repeats)
+            metrics["throughput"][str(length)] = count / elapsed
+            metrics["peak_rss_mb"][f"batch_{length}"] = batch_peak
+
+        # Latence par appel, longueurs mélangées : médiane des centiles de chaque répétition
+        model = load_model(model_path)
+        phrases = [generate(rng.choice(language_names), rng.choice(lengths), rng) for _ in range(count)]
+        measure_latency(model, phrases[:100])  # Échauffement
+        quantiles = (50, 95, 99)
+        percentiles = median_of([np.percentile(measure_latency(model, phrases), quantiles) for _ in range(repeats)])
+        metrics["latency_ms"] = {f"p{q}": value for q, value in zip(quantiles, percentiles)}
+
+    return results
+
+def flatten(metrics, prefix=""):
+    """Aplatit les métriques imbriquées en {"a.b": valeur}."""
+    flat = {}
+    for name, value in metrics.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{name}."))
+        else:
+            flat[f"{prefix}{name}"] = value
+    return flat
+
+def compare(previous, current, tolerance=0.1):
+    """
+    Compare deux résultats ; renvoie la liste des régressions au-delà de tolerance
+    (fraction relative) sous forme de (métrique, avant, après). Des résultats
+    obtenus avec des configurations différentes ne sont pas comparables (ValueError).
+    """
+    if previous.get("config") != current.get("config"):
+        differences = sorted(name for name in set(previous.get("config", {})) | set(current.get("config", {}))
+                             if previous.get("config", {}).get(name) != current.get("config", {}).get(name))
+        raise ValueError(f"configurations différentes ({', '.join(differences)}) : résultats non comparables")
+    regressions = []
+    before = flatten(previous["metrics"])
+    after = flatten(current["metrics"])
+    for name, old in before.items():
+        new = after.get(name)
+        if new is None or not old:
+            continue
+        if name.startswith(HIGHER_IS_BETTER):
+            worse = new < old * (1 - tolerance)
+        else:
+            worse = new > old * (1 + tolerance)
+        if worse:
+            regressions.append((name, old, new))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure le débit, la latence et la mémoire du détecteur sur un corpus synthétique.")
+    parser.add_argument("-o", "--output", help="Fichier JSON des résultats (sinon sortie standard)")
+    parser.add_argument("--compare", help="Résultats JSON d'une exécution précédente à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Écart relatif toléré avant de signaler une régression")
+    parser.add_argument("--languages", type=int, default=8, help="Nombre de langues synthétiques")
+    parser.add_argument("--sentences", type=int, default=3000, help="Phrases d'entraînement par langue")
+    parser.add_argument("--lengths", default="3,10,30,100", help="Longueurs de phrases (en mots) à mesurer")
+    parser.add_argument("--count", type=int, default=2000, help="Phrases par mesure")
+    parser.add_argument("--batch-size", type=int, default=50, help="Nombre de phrases par lot")
+    parser.add_argument("--char-ngrams", help="Mesurer un modèle avec n-grammes de caractères, par exemple 1-5")
+    parser.add_argument("--repeats", type=int, default=5, help="Nombre de répétitions de chaque mesure (médiane)")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du corpus synthétique")
+    args = parser.parse_args()
+
+    features = None
+    if args.char_ngrams:
+        min_n, _, max_n = args.char_ngrams.partition("-")
+        features = {"char_ngrams": [int(min_n), int(max_n or min_n)]}
+
+    results = run_benchmark(args.languages, args.sentences, [int(length) for length in args.lengths.split(",")],
+                            args.count, args.batch_size, args.seed, features, args.repeats)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            previous = json.load(file)
+        try:
+            regressions = compare(previous, results, args.tolerance)
+        except ValueError as error:
+            print(f"Comparaison impossible : {error}", file=sys.stderr)
+            sys.exit(2)
+        for name, old, new in regressions:
+            print(f"Régression {name} : {old:.4g} -> {new:.4g}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
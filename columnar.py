@@ -0,0 +1,279 @@
+import os
+import sys
+import json
+import time
+import argparse
+from collections import deque
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    # pyarrow n'est nécessaire que pour les formats Parquet et Arrow
+    pa = pc = pq = None
+
+from language_detection3 import (load_compiled_model, score_sentences, score_probabilities, bounded_imap,
+                                 iter_batches, fork_pool, worker_state, model_temperature, UNKNOWN_LANGUAGE,
+                                 WEIGHTINGS)
+from model_registry import open_model
+from train import COMPRESSED_OPENERS, open_corpus
+
+FORMATS = ("parquet", "arrow", "jsonl")
+FORMAT_EXTENSIONS = {".parquet": "parquet", ".pq": "parquet", ".arrow": "arrow", ".feather": "arrow",
+                     ".ipc": "arrow", ".jsonl": "jsonl", ".ndjson": "jsonl", ".json": "jsonl"}
+
+# Noms par défaut des colonnes ajoutées : langue, score cosinus et probabilité de la meilleure langue
+RESULT_COLUMNS = ("language", "score", "confidence")
+
+def file_format(path):
+    """Format d'un fichier d'après son extension (une extension de compression est ignorée pour JSONL)."""
+    root, extension = os.path.splitext(path.lower())
+    if extension in COMPRESSED_OPENERS:
+        extension = os.path.splitext(root)[1]
+    if extension not in FORMAT_EXTENSIONS:
+        raise ValueError(f"format inconnu pour {path} (préciser --input-format ou --output-format)")
+    return FORMAT_EXTENSIONS[extension]
+
+def _require_pyarrow(format):
+    if pa is None:
+        raise ImportError(f"le format {format} nécessite pyarrow (pip install pyarrow)")
+
+def classify_texts(texts, model, n, threshold=0.0, temperature=None):
+    """
+    Classe une liste de textes en un seul appel à score_sentences et renvoie
+    trois tableaux : indice de la langue retenue (len(model.languages) pour
+    UNKNOWN_LANGUAGE, voir rank_sentences), meilleur score cosinus et sa
+    probabilité (à la température du modèle par défaut, voir model_temperature).
+    """
+    if not texts:
+        return np.zeros(0, dtype=np.int32), np.zeros(0), np.zeros(0)
+    scores = score_sentences(texts, model, n)
+    best = scores.argmax(axis=1)
+    rows = np.arange(len(texts))
+    best_scores = scores[rows, best]
+    confidences = score_probabilities(scores, temperature or model_temperature(model))[rows, best]
+    languages = np.where(best_scores <= threshold, len(model.languages), best).astype(np.int32)
+    return languages, best_scores, confidences
+
+def _text(row, column):
+    value = row.get(column)
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else str(value)
+
+def batch_texts(batch, column):
+    """
+    Textes distincts d'un lot (RecordBatch Arrow ou liste de lignes JSONL) et,
+    pour chaque ligne, l'indice de son texte. Côté Arrow, le dédoublonnage est
+    fait par dictionary_encode : seuls les textes distincts deviennent des chaînes Python.
+    """
+    if isinstance(batch, list):
+        unique = {}
+        inverse = np.fromiter((unique.setdefault(_text(row, column), len(unique)) for row in batch),
+                              dtype=np.int64, count=len(batch))
+        return list(unique), inverse
+
+    index = batch.schema.get_field_index(column)
+    if index < 0:
+        raise KeyError(f"colonne {column!r} absente (colonnes : {', '.join(batch.schema.names)})")
+    encoded = pc.dictionary_encode(pc.fill_null(batch.column(index), ""))
+    return encoded.dictionary.to_pylist(), encoded.indices.to_numpy(zero_copy_only=False)
+
+def attach_results(batch, inverse, results, labels, names=RESULT_COLUMNS):
+    """
+    Ajoute au lot les colonnes de résultats (remplaçant les colonnes de même
+    nom). Côté Arrow, la langue est une colonne dictionnaire construite
+    directement depuis les indices, sans chaîne par ligne.
+    """
+    languages, scores, confidences = (values[inverse] for values in results)
+    if isinstance(batch, list):
+        for row, language, score, confidence in zip(batch, languages.tolist(), scores.tolist(), confidences.tolist()):
+            row[names[0]] = labels[language]
+            row[names[1]] = score
+            row[names[2]] = confidence
+        return batch
+
+    arrays = [pa.DictionaryArray.from_arrays(pa.array(languages, pa.int32()), pa.array(labels)),
+              pa.array(scores), pa.array(confidences)]
+    kept = [i for i, name in enumerate(batch.schema.names) if name not in names]
+    return pa.RecordBatch.from_arrays([batch.column(i) for i in kept] + arrays,
+                                      names=[batch.schema.names[i] for i in kept] + list(names))
+
+def iter_input_batches(path, format, batch_size):
+    """
+    Lots d'un fichier d'entrée, lus au fur et à mesure : RecordBatch Arrow pour
+    Parquet et Arrow (fichier ou flux IPC), listes de dict pour JSONL
+    (éventuellement compressé). Les lignes JSONL illisibles sont signalées et ignorées.
+    """
+    if format == "parquet":
+        _require_pyarrow(format)
+        yield from pq.ParquetFile(path).iter_batches(batch_size=batch_size)
+    elif format == "arrow":
+        _require_pyarrow(format)
+        source = pa.memory_map(path)
+        try:
+            reader = pa.ipc.open_file(source)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        except pa.ArrowInvalid:
+            source.seek(0)
+            batches = pa.ipc.open_stream(source)
+        # Les lots trop grands sont découpés sans copie
+        for batch in batches:
+            for offset in range(0, batch.num_rows, batch_size):
+                yield batch.slice(offset, batch_size)
+    else:
+        with open_corpus(path) as file:
+            for lines in iter_batches(file, batch_size):
+                rows = []
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError:
+                        row = None
+                    if not isinstance(row, dict):
+                        print(f"Skipping malformed line: {line.strip()}", file=sys.stderr)
+                        continue
+                    rows.append(row)
+                if rows:
+                    yield rows
+
+class BatchWriter:
+    """
+    Écrit des lots (RecordBatch ou listes de dict) au format Parquet, Arrow
+    (fichier IPC) ou JSONL, en convertissant si besoin. Pour Parquet et Arrow,
+    le fichier est ouvert au premier lot, dont le schéma est alors connu.
+    """
+
+    def __init__(self, path, format, names=RESULT_COLUMNS):
+        if format != "jsonl":
+            _require_pyarrow(format)
+        self.path = path
+        self.format = format
+        self.names = names
+        self.rows = 0
+        self.schema = None
+        self._writer = None
+        self._sink = None
+        if format == "jsonl":
+            self._sink = open_corpus(path, 'wt')
+
+    def write(self, batch):
+        if self.format == "jsonl":
+            rows = batch if isinstance(batch, list) else batch.to_pylist()
+            self._sink.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+            self.rows += len(rows)
+            return
+
+        if isinstance(batch, list):
+            # Schéma des lignes JSONL déduit du premier lot, puis imposé aux suivants
+            batch = pa.RecordBatch.from_pylist(batch, schema=self.schema)
+        if self._writer is None:
+            self._open(batch.schema)
+        self._writer.write_batch(batch)
+        self.rows += batch.num_rows
+
+    def _open(self, schema):
+        self.schema = schema
+        if self.format == "parquet":
+            self._writer = pq.ParquetWriter(self.path, schema)
+        else:
+            self._sink = pa.OSFile(self.path, 'wb')
+            self._writer = pa.ipc.new_file(self._sink, schema)
+
+    def close(self):
+        if self.format != "jsonl" and self._writer is None:
+            # Entrée vide : fichier valide avec les seules colonnes de résultats
+            self._open(pa.schema([(self.names[0], pa.dictionary(pa.int32(), pa.string())),
+                                  (self.names[1], pa.float64()), (self.names[2], pa.float64())]))
+        if self._writer is not None:
+            self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+def _classify_texts_worker(texts):
+    return classify_texts(texts, worker_state["model"], worker_state["n"], worker_state["threshold"],
+                          worker_state["temperature"])
+
+def classify_columnar(input_path, output_path, model, n, column="text", input_format=None, output_format=None,
+                      batch_size=10000, threshold=0.0, temperature=None, workers=1,
+                      names=RESULT_COLUMNS):
+    """
+    Classe la colonne de texte column d'un fichier Parquet, Arrow ou JSONL, lu
+    par lots, et écrit chaque lot complété des colonnes de langue, de score et
+    de confiance dans output_path. Seuls les textes distincts de chaque lot
+    sont évalués, en parallèle si workers > 1. Renvoie le nombre de lignes écrites.
+    """
+    input_format = input_format or file_format(input_path)
+    output_format = output_format or file_format(output_path)
+    labels = list(model.languages) + [UNKNOWN_LANGUAGE]
+    batches = iter_input_batches(input_path, input_format, batch_size)
+
+    # Lots lus dont les textes distincts sont en cours d'évaluation, dans l'ordre
+    pending = deque()
+    def tasks():
+        for batch in batches:
+            texts, inverse = batch_texts(batch, column)
+            pending.append((batch, inverse))
+            yield texts
+
+    with BatchWriter(output_path, output_format, names) as writer:
+        if workers <= 1:
+            results = (classify_texts(texts, model, n, threshold, temperature) for texts in tasks())
+            for result in results:
+                batch, inverse = pending.popleft()
+                writer.write(attach_results(batch, inverse, result, labels, names))
+            return writer.rows
+
+        with fork_pool(workers, model=model, n=n, threshold=threshold, temperature=temperature) as pool:
+            for result in bounded_imap(pool, _classify_texts_worker, tasks(), 2 * workers):
+                batch, inverse = pending.popleft()
+                writer.write(attach_results(batch, inverse, result, labels, names))
+        return writer.rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Détecte la langue d'une colonne de texte d'un fichier Parquet, Arrow ou JSONL.")
+    parser.add_argument("input_file", help="Fichier d'entrée (.parquet, .arrow/.feather, .jsonl éventuellement compressé)")
+    parser.add_argument("output_file", help="Fichier de sortie (.parquet, .arrow/.feather, .jsonl éventuellement compressé)")
+    parser.add_argument("--column", default="text", help="Nom de la colonne de texte")
+    parser.add_argument("--input-format", choices=FORMATS, help="Format d'entrée (sinon déduit de l'extension)")
+    parser.add_argument("--output-format", choices=FORMATS, help="Format de sortie (sinon déduit de l'extension)")
+    parser.add_argument("--language-column", default=RESULT_COLUMNS[0], help="Nom de la colonne de langue ajoutée")
+    parser.add_argument("--score-column", default=RESULT_COLUMNS[1], help="Nom de la colonne de score ajoutée")
+    parser.add_argument("--confidence-column", default=RESULT_COLUMNS[2], help="Nom de la colonne de confiance ajoutée")
+    parser.add_argument("--model", help="Modèle compilé ou registre de model_registry.py (sinon construit depuis --directory)")
+    parser.add_argument("--directory", default="language_files2", help="Répertoire des corpus par langue")
+    parser.add_argument("-n", type=int, default=3, help="Taille des n-grammes (ignorée avec --model)")
+    parser.add_argument("--weighting", choices=WEIGHTINGS, default="count",
+                        help="Pondération des caractéristiques du modèle construit depuis --directory")
+    parser.add_argument("--threshold", type=float, default=0.0,
+                        help="Score en dessous duquel (ou égal auquel) la langue est \"unknown\"")
+    parser.add_argument("--temperature", type=float,
+                        help="Température du softmax qui donne la confiance (par défaut celle du modèle)")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Nombre de lignes par lot")
+    parser.add_argument("--workers", type=int, default=1, help="Nombre de processus")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    model = open_model(args.model) if args.model else load_compiled_model(args.directory, args.n, weighting=args.weighting)
+    print(f"Modèle chargé en {time.time() - start_time:.2f} secondes", file=sys.stderr)
+
+    names = (args.language_column, args.score_column, args.confidence_column)
+    rows = classify_columnar(args.input_file, args.output_file, model, model.n, args.column, args.input_format,
+                             args.output_format, args.batch_size, args.threshold, args.temperature, args.workers, names)
+    elapsed = time.time() - start_time
+    print(f"{rows} lignes écrites dans {args.output_file} en {elapsed:.2f} secondes", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
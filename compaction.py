@@ -0,0 +1,121 @@
+import os
+import sys
+import argparse
+import tempfile
+
+import numpy as np
+
+from language_detection3 import (LanguageModel, compile_arrays, model_arrays, save_model, load_model,
+                                 load_compiled_model, detect_languages)
+from eval2 import compute_accuracy
+
+# Types de stockage des poids ; scipy.sparse ne gère pas float16, uint8 (avec une
+# échelle par langue) couvre donc l'extrémité la plus compacte
+WEIGHT_DTYPES = ("float64", "float32", "uint8")
+
+def prune_model(model, min_count=None, top_k=None):
+    """
+    Élague un modèle : ne garde que les caractéristiques vues au moins min_count
+    fois et/ou les top_k plus fréquentes de chaque langue, puis renormalise.
+    """
+    rows, hashes, counts = model_arrays(model)
+    keep = np.ones(len(counts), dtype=bool)
+    if min_count:
+        # Tolérance pour les nombres retrouvés à partir de poids arrondis
+        keep &= counts >= min_count - 1e-6
+
+    if top_k:
+        # Rang de chaque caractéristique dans sa langue, par nombre décroissant
+        order = np.lexsort((-counts, rows))
+        starts = np.searchsorted(rows[order], rows[order], side="left")
+        ranks = np.empty(len(counts), dtype=np.int64)
+        ranks[order] = np.arange(len(counts)) - starts
+        keep &= ranks < top_k
+
+    return compile_arrays(model.languages, rows[keep], hashes[keep], counts[keep], model.n, model.features,
+                          model.temperature)
+
+def quantize_model(model, dtype="uint8"):
+    """
+    Change le type de stockage des poids normalisés. En uint8, chaque langue a
+    une échelle (poids maximal / 255) et les poids arrondis à zéro disparaissent.
+    """
+    if dtype not in WEIGHT_DTYPES:
+        raise ValueError(f"type de poids inconnu : {dtype}")
+
+    rows, hashes, counts = model_arrays(model)
+    # Repartir des poids réels, même si le modèle était déjà quantifié
+    model = compile_arrays(model.languages, rows, hashes, counts, model.n, model.features, model.temperature)
+    if dtype == "float64":
+        return model
+
+    postings = model.postings.copy()
+    scales = None
+    if dtype == "float32":
+        postings = postings.astype(np.float32)
+    else:
+        maxima = np.zeros(len(model.languages))
+        np.maximum.at(maxima, postings.indices, postings.data)
+        scales = np.where(maxima > 0, maxima / 255, 1.0)
+        postings.data = np.rint(postings.data / scales[postings.indices]).astype(np.uint8)
+        postings.eliminate_zeros()
+    return LanguageModel(model.languages, model.keys, postings, model.norms, model.n, model.features, scales,
+                         model.temperature)
+
+def model_nbytes(model):
+    """Mémoire occupée par les tableaux du modèle, en octets."""
+    arrays = [model.keys, model.postings.indptr, model.postings.indices, model.postings.data, model.norms]
+    if model.scales is not None:
+        arrays.append(model.scales)
+    return sum(np.asarray(array).nbytes for array in arrays)
+
+def evaluate(model, gold_lines, batch_size=1000):
+    """Précision (%) du modèle sur des lignes "phrase\\tlangue", calculée comme eval2.py."""
+    phrases = [line.split("\t", 1)[0] for line in gold_lines]
+    predictions = []
+    for i in range(0, len(phrases), batch_size):
+        batch = phrases[i:i + batch_size]
+        predictions.extend(f"{phrase}\t{language}" for phrase, language in zip(batch, detect_languages(batch, model, model.n)))
+    tp, total = compute_accuracy(predictions, gold_lines)
+    return 100.0 * tp / total if total else 0.0
+
+def compact_model(model, min_count=None, top_k=None, dtype="float64"):
+    """Élagage puis quantification."""
+    if min_count or top_k:
+        model = prune_model(model, min_count, top_k)
+    return quantize_model(model, dtype)
+
+def main():
+    parser = argparse.ArgumentParser(description="Élague et quantifie un modèle compilé, et mesure le compromis précision / taille.")
+    parser.add_argument("goldfile", help="Fichier de référence \"phrase\\tlangue\" pour mesurer la précision")
+    parser.add_argument("--model", help="Modèle compilé (sinon construit depuis --directory)")
+    parser.add_argument("--directory", default="language_files2", help="Répertoire des corpus par langue")
+    parser.add_argument("-n", type=int, default=3, help="Taille des n-grammes (ignorée avec --model)")
+    parser.add_argument("--min-count", type=int, nargs="+", default=[0], help="Nombres minimaux d'occurrences à essayer")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[0], help="Nombres de caractéristiques par langue à essayer (0 : toutes)")
+    parser.add_argument("--dtype", nargs="+", default=list(WEIGHT_DTYPES), choices=WEIGHT_DTYPES, help="Types de poids à essayer")
+    parser.add_argument("-o", "--output", help="Écrire le modèle compacté (une seule configuration)")
+    args = parser.parse_args()
+
+    configurations = [(min_count, top_k, dtype) for min_count in args.min_count
+                      for top_k in args.top_k for dtype in args.dtype]
+    if args.output and len(configurations) != 1:
+        parser.error("--output demande une seule valeur pour --min-count, --top-k et --dtype")
+
+    model = load_model(args.model) if args.model else load_compiled_model(args.directory, args.n)
+    with open(args.goldfile, 'r', encoding='utf-8') as file:
+        gold_lines = [line for line in file if line.strip()]
+
+    print(f"{'min_count':>9} {'top_k':>8} {'dtype':>8} {'entrées':>10} {'mémoire (Mo)':>13} {'fichier (Mo)':>13} {'précision':>10}")
+    with tempfile.TemporaryDirectory(prefix="compaction_") as temp_dir:
+        for min_count, top_k, dtype in configurations:
+            compacted = compact_model(model, min_count, top_k, dtype)
+            path = args.output or os.path.join(temp_dir, "model.bin")
+            save_model(compacted, path)
+            accuracy = evaluate(compacted, gold_lines)
+            print(f"{min_count:>9} {top_k:>8} {dtype:>8} {compacted.postings.nnz:>10} "
+                  f"{model_nbytes(compacted) / 2**20:>13.2f} {os.path.getsize(path) / 2**20:>13.2f} {accuracy:>9.2f}%")
+            sys.stdout.flush()
+
+if __name__ == "__main__":
+    main()
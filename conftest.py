@@ -0,0 +1 @@
+# Présent à la racine du dépôt pour que pytest ajoute celle-ci à sys.path (les tests importent les modules)
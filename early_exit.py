@@ -0,0 +1,126 @@
+import sys
+import math
+import re
+import argparse
+
+import numpy as np
+
+from language_detection3 import features_to_matrix, postings_product, load_model, load_compiled_model, UNKNOWN_LANGUAGE
+from normalizer import normalize_text
+from features import extract_chunk_features
+
+# Premier espace après la taille de morceau demandée : un morceau ne coupe jamais un mot
+_WHITESPACE = re.compile(r"\s")
+
+class EarlyExitResult:
+    """
+    Résultat d'une détection avec arrêt anticipé : langue retenue, confiance
+    (écart relatif entre les deux meilleurs scores), quantité de texte lue et
+    indicateur complete (tout le texte a été lu).
+    """
+
+    def __init__(self, language, confidence, scores, chars_read, words_read, complete):
+        self.language = language
+        self.confidence = confidence
+        self.scores = scores
+        self.chars_read = chars_read
+        self.words_read = words_read
+        self.complete = complete
+
+    def __repr__(self):
+        return (f"EarlyExitResult(language={self.language!r}, confidence={self.confidence:.3f}, "
+                f"chars_read={self.chars_read}, words_read={self.words_read}, complete={self.complete})")
+
+def iter_text_chunks(text, chunk_chars=1000):
+    """Découpe un texte en morceaux d'environ chunk_chars caractères, coupés sur un espace."""
+    start = 0
+    while start < len(text):
+        match = _WHITESPACE.search(text, start + chunk_chars)
+        end = match.end() if match else len(text)
+        yield text[start:end]
+        start = end
+
+def margin_confidence(scores):
+    """Écart relatif entre les deux meilleurs scores, entre 0 (égalité) et 1."""
+    if len(scores) == 0:
+        return 0.0
+    if len(scores) == 1:
+        return 1.0 if scores[0] > 0 else 0.0
+    second, first = np.partition(scores, len(scores) - 2)[-2:]
+    return float((first - second) / first) if first > 0 else 0.0
+
+def detect_language_early_exit(text, model, n, confidence=0.05, chunk_chars=1000, min_words=50):
+    """
+    Détecte la langue d'un long document en le lisant par morceaux : les
+    produits scalaires avec chaque langue et la norme du document sont mis à
+    jour à chaque morceau, et la lecture s'arrête dès que la confiance
+    (voir margin_confidence) atteint le seuil après au moins min_words mots.
+    Si tout le texte est lu, les scores sont ceux de score_sentences. Comme
+    avec rank_sentences, un texte sans aucun n-gramme connu (vide, par
+    exemple) reçoit UNKNOWN_LANGUAGE.
+    """
+    dot_products = np.zeros(len(model.languages))
+    document_features = {}
+    squared_norm = 0.0
+    history = None
+    chars_read = words_read = 0
+    scores = dot_products
+    current = 0.0
+    chunks = iter_text_chunks(text, chunk_chars)
+    chunk = next(chunks, None)
+
+    while chunk is not None:
+        next_chunk = next(chunks, None)
+        words = normalize_text(chunk).split()
+        chunk_features, history = extract_chunk_features(words, n, model.features, history,
+                                                         final=next_chunk is None)
+        chars_read += len(chunk)
+        words_read += len(words)
+
+        # |x + d|² = |x|² + 2.x.d + |d|², puis x.p += d.p pour chaque langue
+        for key, count in chunk_features.items():
+            previous = document_features.get(key, 0)
+            squared_norm += 2 * previous * count + count * count
+            document_features[key] = previous + count
+        hashes = np.fromiter(chunk_features.keys(), dtype=np.uint64, count=len(chunk_features))
+        counts = np.fromiter(chunk_features.values(), dtype=np.float64, count=len(chunk_features))
+        vectors = features_to_matrix(hashes, counts, np.array([len(chunk_features)]), model.keys)
+        dot_products += postings_product(vectors, model)[0]
+
+        scores = dot_products / math.sqrt(squared_norm) if squared_norm > 0 else dot_products
+        current = margin_confidence(scores)
+        chunk = next_chunk
+        if chunk is not None and words_read >= min_words and current >= confidence:
+            break
+
+    language = UNKNOWN_LANGUAGE
+    if len(scores) and scores.max() > 0:
+        language = model.languages[int(np.argmax(scores))]
+    return EarlyExitResult(language, current,
+                           dict(zip(model.languages, scores.tolist())),
+                           chars_read, words_read, chunk is None)
+
+def main():
+    parser = argparse.ArgumentParser(description="Détecte la langue d'un long document en s'arrêtant dès que la confiance est suffisante.")
+    parser.add_argument("document", nargs="?", default="-", help="Fichier texte UTF-8 (- : entrée standard)")
+    parser.add_argument("--model", help="Modèle compilé (sinon construit depuis --directory)")
+    parser.add_argument("--directory", default="language_files2", help="Répertoire des corpus par langue")
+    parser.add_argument("-n", type=int, default=3, help="Taille des n-grammes (ignorée avec --model)")
+    parser.add_argument("--confidence", type=float, default=0.05, help="Écart relatif minimal entre les deux meilleures langues")
+    parser.add_argument("--chunk-chars", type=int, default=1000, help="Taille des morceaux lus, en caractères")
+    parser.add_argument("--min-words", type=int, default=50, help="Nombre de mots à lire avant de pouvoir s'arrêter")
+    args = parser.parse_args()
+
+    model = load_model(args.model) if args.model else load_compiled_model(args.directory, args.n)
+    if args.document == "-":
+        text = sys.stdin.read()
+    else:
+        with open(args.document, 'r', encoding='utf-8') as file:
+            text = file.read()
+
+    result = detect_language_early_exit(text, model, model.n, args.confidence, args.chunk_chars, args.min_words)
+    print(f"{result.language}\tconfiance {result.confidence:.3f}\t{result.chars_read}/{len(text)} caractères lus"
+          + ("" if result.complete else " (arrêt anticipé)"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import time
+import argparse
+from collections import Counter
+
+from language_detection3 import (load_compiled_model, save_model, rank_sentences, bounded_imap, iter_batches,
+                                 calibrate_temperature, model_temperature, fork_pool, worker_state, WEIGHTINGS)
+from model_registry import open_model
+
+def parse_gold_lines(lines):
+    """
+    Sépare des lignes de référence "phrase\\tlangue" en listes de phrases et
+    de langues. Les lignes mal formées sont signalées sur la sortie d'erreur et ignorées.
+    """
+    phrases, gold = [], []
+    for line in lines:
+        parts = line.rstrip("\n").split("\t")
+        if len(parts) != 2:
+            if line.strip():
+                print(f"Skipping malformed line: {line.strip()}", file=sys.stderr)
+            continue
+        phrases.append(parts[0])
+        gold.append(parts[1].strip())
+    return phrases, gold
+
+def evaluate_batch(batch, model, threshold=None):
+    """
+    Détecte la langue d'un lot de lignes de référence "phrase\\tlangue" (voir
+    parse_gold_lines) et renvoie un Counter {(langue de référence, langue
+    prédite): nombre}. Avec un seuil, les phrases dont le meilleur score ne le
+    dépasse pas sont prédites "unknown".
+    """
+    phrases, gold = parse_gold_lines(batch)
+    if not phrases:
+        return Counter()
+    threshold = float("-inf") if threshold is None else threshold
+    predicted = rank_sentences(phrases, model, model.n, k=1, threshold=threshold).labels
+    return Counter(zip(gold, predicted))
+
+def _evaluate_batches_worker(batches):
+    confusion = Counter()
+    for batch in batches:
+        confusion.update(evaluate_batch(batch, worker_state["model"], worker_state["threshold"]))
+    return confusion
+
+def evaluate_stream(lines, model, threshold=None, batch_size=1000, workers=1, chunksize=1):
+    """
+    Évalue le modèle sur un itérable de lignes de référence, lu au fur et à
+    mesure, en parallèle si workers > 1. Renvoie la matrice de confusion
+    sous forme de Counter {(référence, prédiction): nombre}.
+    """
+    confusion = Counter()
+    batches = iter_batches(lines, batch_size)
+    if workers <= 1:
+        for batch in batches:
+            confusion.update(evaluate_batch(batch, model, threshold))
+        return confusion
+
+    with fork_pool(workers, model=model, threshold=threshold) as pool:
+        for partial in bounded_imap(pool, _evaluate_batches_worker, iter_batches(batches, chunksize), 2 * workers):
+            confusion.update(partial)
+    return confusion
+
+def language_metrics(confusion):
+    """
+    Précision, rappel, F1 et nombre d'exemples de chaque langue de référence ou
+    prédite, à partir d'une matrice de confusion : {langue: (P, R, F1, support)}.
+    """
+    true_positives, predicted, support = Counter(), Counter(), Counter()
+    for (gold, prediction), count in confusion.items():
+        support[gold] += count
+        predicted[prediction] += count
+        if gold == prediction:
+            true_positives[gold] += count
+
+    result = {}
+    for language in sorted(set(support) | set(predicted)):
+        precision = true_positives[language] / predicted[language] if predicted[language] else 0.0
+        recall = true_positives[language] / support[language] if support[language] else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        result[language] = (precision, recall, f1, support[language])
+    return result
+
+def evaluation_report(confusion, elapsed):
+    """Résumé sérialisable en JSON : précision globale, mesures par langue, confusion et débit."""
+    total = sum(confusion.values())
+    correct = sum(count for (gold, prediction), count in confusion.items() if gold == prediction)
+    return {
+        "sentences": total,
+        "accuracy": 100.0 * correct / total if total else 0.0,
+        "seconds": elapsed,
+        "sentences_per_second": total / elapsed if elapsed > 0 else 0.0,
+        "languages": {language: {"precision": precision, "recall": recall, "f1": f1, "support": support}
+                      for language, (precision, recall, f1, support) in language_metrics(confusion).items()},
+        "confusion": [[gold, prediction, count] for (gold, prediction), count in sorted(confusion.items())],
+    }
+
+def print_report(name, report, confusion, output=sys.stdout):
+    print(f"Modèle : {name}", file=output)
+    print(f"Accuracy: {report['accuracy']:.2f}% ({report['sentences']} phrases) - "
+          f"{report['sentences_per_second']:.0f} phrases/s ({report['seconds']:.2f}s)", file=output)
+
+    print(f"\n{'langue':>10} {'précision':>10} {'rappel':>8} {'F1':>8} {'support':>8}", file=output)
+    for language, values in report["languages"].items():
+        print(f"{language:>10} {values['precision']:>10.3f} {values['recall']:>8.3f} "
+              f"{values['f1']:>8.3f} {values['support']:>8}", file=output)
+
+    # Matrice de confusion : référence en ligne, prédiction en colonne
+    languages = list(report["languages"])
+    width = max([8] + [len(language) + 1 for language in languages])
+    corner = "réf/préd"
+    print(f"\n{corner:>10}" + "".join(f"{language:>{width}}" for language in languages), file=output)
+    for gold in languages:
+        print(f"{gold:>10}" + "".join(f"{confusion[gold, prediction]:>{width}}" for prediction in languages),
+              file=output)
+    print(file=output)
+
+def main():
+    parser = argparse.ArgumentParser(description="Évalue un ou plusieurs modèles directement sur un fichier de référence \"phrase\\tlangue\".")
+    parser.add_argument("goldfile", help="Fichier de référence, une phrase par ligne, UTF-8")
+    parser.add_argument("--model", nargs="+", help="Modèles compilés ou registres de model_registry.py à comparer (sinon construits depuis --directory)")
+    parser.add_argument("--directory", default="language_files2", help="Répertoire des corpus par langue")
+    parser.add_argument("-n", type=int, nargs="+", default=[3], help="Tailles des n-grammes à comparer (ignorées avec --model)")
+    parser.add_argument("--weighting", nargs="+", choices=WEIGHTINGS, default=["count"],
+                        help="Pondérations à comparer (ignorées avec --model)")
+    parser.add_argument("--memory-budget", type=float, default=256,
+                        help="Mémoire maximale des profils chargés d'un registre (Mo)")
+    parser.add_argument("--threshold", type=float, help="Score en dessous duquel la prédiction est \"unknown\" (par défaut : jamais)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Nombre de lignes par lot")
+    parser.add_argument("--workers", type=int, default=1, help="Nombre de processus")
+    parser.add_argument("--chunksize", type=int, default=1, help="Nombre de lots envoyés à la fois à un processus")
+    parser.add_argument("--calibrate", action="store_true",
+                        help="Ajuster la température de chaque modèle --model sur le fichier de référence et l'y enregistrer")
+    parser.add_argument("-o", "--output", help="Écrire aussi les rapports au format JSON dans ce fichier")
+    args = parser.parse_args()
+
+    if args.model:
+        candidates = [(path, lambda path=path: open_model(path, int(args.memory_budget * 2**20))) for path in args.model]
+    else:
+        candidates = [(f"{args.directory} (n={n}, {weighting})",
+                       lambda n=n, weighting=weighting: load_compiled_model(args.directory, n, weighting=weighting))
+                      for n in args.n for weighting in args.weighting]
+
+    reports = {}
+    for name, load in candidates:
+        model = load()
+        start_time = time.perf_counter()
+        with open(args.goldfile, 'r', encoding='utf-8') as file:
+            confusion = evaluate_stream(file, model, args.threshold, args.batch_size, args.workers, args.chunksize)
+        report = evaluation_report(confusion, time.perf_counter() - start_time)
+        print_report(name, report, confusion)
+
+        if args.calibrate:
+            if not args.model or os.path.isdir(name):
+                print(f"Calibration ignorée pour {name} : seul un fichier de modèle compilé peut l'enregistrer",
+                      file=sys.stderr)
+            else:
+                with open(args.goldfile, 'r', encoding='utf-8') as file:
+                    phrases, gold = parse_gold_lines(file)
+                temperature = calibrate_temperature(model, phrases, gold)
+                save_model(model, name)
+                print(f"Température ajustée : {temperature:.4g} (enregistrée dans {name})\n")
+        report["temperature"] = model_temperature(model)
+        reports[name] = report
+
+    if len(reports) > 1:
+        print(f"{'modèle':<40} {'précision':>10} {'phrases/s':>10}")
+        for name, report in reports.items():
+            print(f"{name:<40} {report['accuracy']:>9.2f}% {report['sentences_per_second']:>10.0f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(reports, file, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import hashlib
+from array import array
+from functools import lru_cache
+from collections import Counter
+
+# Préfixe des n-grammes de caractères : un caractère d'espacement ne peut pas
+# apparaître dans un mot prétraité, donc pas de collision avec les n-grammes de mots
+CHAR_PREFIX = "\x1e"
+
+def ngrams_from_words(words, n, frequent_words=None):
+    """
+    Génère les n-grammes d'une liste de mots déjà prétraités.
+    """
+    words = [word for word in words if frequent_words is None or word not in frequent_words]
+    words = ["<s>"] * (n - 1) + words + ["</s>"]
+    return Counter(tuple(words[i:i + n]) for i in range(len(words) - n + 1))
+
+def char_ngrams_from_words(words, min_n=1, max_n=5):
+    """
+    Génère les n-grammes de caractères (de min_n à max_n) de chaque mot,
+    encadré d'espaces pour marquer le début et la fin du mot.
+    """
+    char_counter = Counter()
+    for word in words:
+        padded = f" {word} "
+        for size in range(min_n, max_n + 1):
+            char_counter.update(padded[i:i + size] for i in range(len(padded) - size + 1))
+    return char_counter
+
+def feature_hash(text):
+    """
+    Identifiant stable (64 bits) d'une caractéristique, identique d'un processus
+    à l'autre contrairement à hash().
+    """
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+def ngram_hash(ngram):
+    """Identifiant d'un n-gramme de mots."""
+    return feature_hash("\x1f".join(ngram))
+
+def char_ngram_hash(gram):
+    """Identifiant d'un n-gramme de caractères."""
+    return feature_hash(CHAR_PREFIX + gram)
+
+def extract_features(words, n, features=None):
+    """
+    Extrait les caractéristiques d'une liste de mots prétraités sous forme de
+    Counter {identifiant: nombre d'occurrences}.
+
+    features configure l'extracteur (None : n-grammes de mots seuls) :
+    - "char_ngrams" : [min, max] pour ajouter les n-grammes de caractères ;
+    - "hash_size" : taille de l'espace de hachage (identifiants pris modulo hash_size).
+    Avec n = 0, seuls les n-grammes de caractères sont utilisés.
+    """
+    features = features or {}
+    char_ngrams = features.get("char_ngrams")
+    hash_size = features.get("hash_size")
+    feature_counter = Counter()
+
+    if n > 0:
+        for ngram, count in ngrams_from_words(words, n).items():
+            feature_counter[ngram_hash(ngram)] += count
+    if char_ngrams:
+        for gram, count in char_ngrams_from_words(words, *char_ngrams).items():
+            feature_counter[char_ngram_hash(gram)] += count
+
+    return fold_features(feature_counter, hash_size)
+
+def extract_chunk_features(words, n, features=None, history=None, final=False):
+    """
+    Variante de extract_features pour un texte lu morceau par morceau.
+    history contient les n - 1 derniers mots du morceau précédent (None pour le
+    premier morceau, qui reçoit les marqueurs <s>) ; final ajoute le marqueur </s>.
+    La somme des caractéristiques de tous les morceaux est égale à celle de
+    extract_features sur le texte entier. Renvoie (caractéristiques, nouvel historique).
+    """
+    features = features or {}
+    char_ngrams = features.get("char_ngrams")
+    feature_counter = Counter()
+    new_history = []
+
+    if n > 0:
+        if history is None:
+            history = ["<s>"] * (n - 1)
+        window = list(history) + list(words) + (["</s>"] if final else [])
+        for i in range(len(window) - n + 1):
+            feature_counter[ngram_hash(tuple(window[i:i + n]))] += 1
+        new_history = window[len(window) - (n - 1):] if n > 1 else []
+    if char_ngrams:
+        for gram, count in char_ngrams_from_words(words, *char_ngrams).items():
+            feature_counter[char_ngram_hash(gram)] += count
+
+    return fold_features(feature_counter, features.get("hash_size")), new_history
+
+@lru_cache(maxsize=1 << 18)
+def cached_feature_hash(text):
+    """feature_hash mis en cache : les n-grammes fréquents ne sont hachés qu'une fois."""
+    return feature_hash(text)
+
+@lru_cache(maxsize=1 << 16)
+def word_char_hashes(word, min_n=1, max_n=5):
+    """
+    Identifiants des n-grammes de caractères d'un mot (avec répétitions), calculés
+    une seule fois par mot : les mots d'un texte se répètent beaucoup plus que les phrases.
+    """
+    padded = f" {word} "
+    return array("Q", [cached_feature_hash(CHAR_PREFIX + padded[i:i + size])
+                       for size in range(min_n, max_n + 1) for i in range(len(padded) - size + 1)])
+
+def append_features(buffer, words, n, features=None):
+    """
+    Extracteur en une passe : ajoute à buffer (array("Q") réutilisé pour tout un
+    lot) les identifiants des caractéristiques de words, avec répétitions et sans
+    créer de Counter ni de tuple par n-gramme. Le comptage des identifiants donne
+    extract_features(words, n, features) avant le repli par hash_size.
+    Renvoie le nombre d'identifiants ajoutés.
+    """
+    features = features or {}
+    char_ngrams = features.get("char_ngrams")
+    start = len(buffer)
+
+    if n > 0:
+        # Fenêtre glissante sur le flux de mots encadré des marqueurs
+        tokens = ["<s>"] * (n - 1) + words + ["</s>"]
+        buffer.extend(cached_feature_hash("\x1f".join(tokens[i:i + n])) for i in range(len(tokens) - n + 1))
+    if char_ngrams:
+        min_n, max_n = char_ngrams
+        for word in words:
+            buffer.extend(word_char_hashes(word, min_n, max_n))
+    return len(buffer) - start
+
+def fold_features(feature_counter, hash_size=None):
+    """Ramène les identifiants dans un espace de hash_size caractéristiques (inchangés si None)."""
+    if not hash_size:
+        return feature_counter
+    folded = Counter()
+    for key, count in feature_counter.items():
+        folded[key % hash_size] += count
+    return folded
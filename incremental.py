@@ -0,0 +1,158 @@
+import threading
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+from language_detection3 import (extract_batch_features, features_to_matrix, postings_product,
+                                 compile_arrays, model_arrays, save_model, load_model, model_weighting)
+from normalizer import normalize_lines
+from features import extract_features
+
+class IncrementalModel:
+    """
+    Modèle compilé qui accepte de nouvelles phrases étiquetées sans réentraînement.
+
+    Les ajouts sont conservés dans des couches de deltas ({langue: Counter})
+    au-dessus du modèle de base, qui reste en lecture seule (il peut être
+    projeté en mémoire). La norme de chaque langue est mise à jour à chaque
+    ajout, de sorte que les scores restent des similarités cosinus exactes sur
+    base + deltas. compact() replie les deltas dans un nouveau modèle de base,
+    éventuellement dans un thread d'arrière-plan pendant que les ajouts continuent.
+
+    Les phrases ajoutées sont découpées comme à la détection (extract_features,
+    sans filtrage des mots fréquents).
+    """
+
+    def __init__(self, base):
+        if model_weighting(base.features) != "count":
+            raise ValueError("IncrementalModel demande un modèle pondéré par les nombres bruts (weighting \"count\")")
+        self.base = base
+        self.n = base.n
+        self.features = base.features
+        self.languages = list(base.languages)
+        self.temperature = getattr(base, "temperature", None)
+        self._squared_norms = np.asarray(base.norms, dtype=np.float64) ** 2
+        self._layers = [{}]
+        self._delta = None
+        self._lock = threading.RLock()
+        self._compaction = None
+
+    def _language_index(self, language):
+        """Indice d'une langue, ajoutée au modèle si elle est nouvelle."""
+        if language not in self.languages:
+            self.languages.append(language)
+            self._squared_norms = np.append(self._squared_norms, 0.0)
+        return self.languages.index(language)
+
+    def _base_count(self, key, language_index):
+        """Nombre d'occurrences d'une caractéristique pour une langue dans le modèle de base."""
+        base = self.base
+        if language_index >= len(base.languages):
+            return 0.0
+        column = np.searchsorted(base.keys, key)
+        if column >= len(base.keys) or base.keys[column] != key:
+            return 0.0
+        start, end = base.postings.indptr[column], base.postings.indptr[column + 1]
+        postings = base.postings.indices[start:end]
+        position = np.searchsorted(postings, language_index)
+        if position < len(postings) and postings[position] == language_index:
+            weight = float(base.postings.data[start + position])
+            if base.scales is not None:
+                weight *= base.scales[language_index]
+            return weight * base.norms[language_index]
+        return 0.0
+
+    def add_sentences(self, labeled_phrases):
+        """Ajoute des couples (phrase, langue) au modèle ; une langue inconnue est créée."""
+        labeled_phrases = list(labeled_phrases)
+        lines = normalize_lines([phrase for phrase, _ in labeled_phrases])
+
+        with self._lock:
+            for (_, language), line in zip(labeled_phrases, lines):
+                language_index = self._language_index(language)
+                for key, count in extract_features(line.split(), self.n, self.features).items():
+                    old = self._base_count(key, language_index)
+                    old += sum(layer[language_index][key] for layer in self._layers if language_index in layer)
+                    # |v + c.e|² = |v|² + 2.c.v[e] + c²
+                    self._squared_norms[language_index] += 2 * old * count + count * count
+                    self._layers[-1].setdefault(language_index, Counter())[key] += count
+            self._delta = None
+
+    def _layer_arrays(self, layers):
+        """Triplets (indice de langue, identifiant, nombre) de plusieurs couches de deltas."""
+        rows, hashes, data = [], [], []
+        for layer in layers:
+            for language_index, counter in layer.items():
+                rows.append(np.full(len(counter), language_index, dtype=np.int64))
+                hashes.append(np.fromiter(counter.keys(), dtype=np.uint64, count=len(counter)))
+                data.append(np.fromiter(counter.values(), dtype=np.float64, count=len(counter)))
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint64), np.zeros(0)
+        return np.concatenate(rows), np.concatenate(hashes), np.concatenate(data)
+
+    def _delta_postings(self):
+        """Index inversé (caractéristiques x langues) des nombres bruts de toutes les couches, mis en cache."""
+        if self._delta is None:
+            rows, hashes, data = self._layer_arrays(self._layers)
+            keys = np.unique(hashes)
+            postings = sparse.csr_matrix((data, (np.searchsorted(keys, hashes), rows)),
+                                         shape=(len(keys), len(self.languages)))
+            self._delta = (keys, postings)
+        return self._delta
+
+    def score(self, phrases, n):
+        """Similarité cosinus (phrases x langues) avec les profils base + deltas."""
+        with self._lock:
+            base = self.base
+            delta_keys, delta_postings = self._delta_postings()
+            norms = np.sqrt(self._squared_norms)
+        hashes, counts, lengths, phrase_norms = extract_batch_features(phrases, n, self.features)
+
+        # Produits scalaires bruts : base (poids normalisés remultipliés par la norme) + deltas
+        dot_products = np.zeros((len(phrases), delta_postings.shape[1]))
+        base_vectors = features_to_matrix(hashes, counts, lengths, base.keys)
+        dot_products[:, :len(base.languages)] = postings_product(base_vectors, base) * np.asarray(base.norms)
+        delta_vectors = features_to_matrix(hashes, counts, lengths, delta_keys)
+        dot_products += (delta_vectors @ delta_postings).toarray()
+
+        denominators = phrase_norms[:, None] * norms[None, :]
+        denominators[denominators == 0] = np.inf
+        return dot_products / denominators
+
+    def compact(self, path=None, background=False):
+        """
+        Replie les deltas dans un nouveau modèle de base (écrit dans path si donné).
+        Avec background=True, la compaction tourne dans un thread qui est renvoyé ;
+        les ajouts faits pendant ce temps vont dans une nouvelle couche.
+        """
+        with self._lock:
+            if self._compaction is not None and self._compaction.is_alive():
+                return self._compaction
+            frozen = len(self._layers)
+            self._layers.append({})
+            base = self.base
+            layers = self._layers[:frozen]
+            languages = list(self.languages)
+
+        def run():
+            base_rows, base_hashes, base_data = model_arrays(base)
+            rows, hashes, data = self._layer_arrays(layers)
+            new_base = compile_arrays(languages, np.concatenate([base_rows, rows]),
+                                      np.concatenate([base_hashes, hashes]),
+                                      np.concatenate([base_data, data]), base.n, base.features,
+                                      base.temperature)
+            if path:
+                save_model(new_base, path)
+                new_base = load_model(path)
+            with self._lock:
+                self.base = new_base
+                del self._layers[:frozen]
+                self._delta = None
+
+        if not background:
+            run()
+            return None
+        self._compaction = threading.Thread(target=run, daemon=True)
+        self._compaction.start()
+        return self._compaction
@@ -4,6 +4,7 @@ import re
 import unicodedata
 from collections import Counter
 import time
+import multiprocessing
 
 def preprocess_text(line):
     """Nettoyage de texte : minuscule, suppression des accents, des nombres isolés et de la ponctuation."""
@@ -51,7 +52,11 @@ def cosine_similarity(ngram_counter_1, ngram_counter_2):
     if not hasattr(ngram_counter_2, '_magnitude'):
         ngram_counter_2._magnitude = math.sqrt(sum(count ** 2 for count in ngram_counter_2.values()))
 
-    magnitude_1 = math.sqrt(sum(count ** 2 for count in ngram_counter_1.values()))
+    # La norme de la phrase n'est calculée qu'une fois pour toutes les langues candidates
+    if not hasattr(ngram_counter_1, '_magnitude'):
+        ngram_counter_1._magnitude = math.sqrt(sum(count ** 2 for count in ngram_counter_1.values()))
+
+    magnitude_1 = ngram_counter_1._magnitude
     magnitude_2 = ngram_counter_2._magnitude
 
     if magnitude_1 == 0 or magnitude_2 == 0:
@@ -107,8 +112,57 @@ def detect_language(phrase, language_ngrams, n):
 
         return detected_language
 
-def process_file(input_file, language_ngrams, n, batch_size=50):
-    """Traite un fichier d'entrée par lots."""
+def classify_batch(batch, language_ngrams, n):
+    """Classe un lot de lignes et indique si une étiquette "??" a été remplacée."""
+    batch_results = []
+    modify = False
+
+    for line in batch:
+        parts = line.split("\t")
+        if len(parts) != 2:
+            print(f"Skipping malformed line: {line.strip()}")
+            batch_results.append(line)
+            continue
+
+        phrase, true_language = parts[0], parts[1].strip()
+        detected_language = detect_language(phrase, language_ngrams, n)
+
+        if true_language == "??":
+            batch_results.append(f"{phrase}\t{detected_language}\n")
+            modify = True
+        else:
+            batch_results.append(line)
+
+    return batch_results, modify
+
+# Profils propres à chaque processus de travail, initialisés une seule fois par processus
+_worker_language_ngrams = None
+_worker_n = None
+
+def _init_worker(language_ngrams, n):
+    """Initialise les profils d'un processus de travail (hérités par fork si possible)."""
+    global _worker_language_ngrams, _worker_n
+    _worker_language_ngrams = language_ngrams
+    _worker_n = n
+
+def _classify_batch_worker(batch):
+    """Point d'entrée des processus de travail."""
+    return classify_batch(batch, _worker_language_ngrams, _worker_n)
+
+def classify_batches(batches, language_ngrams, n, workers=1, chunksize=1):
+    """Classe une séquence de lots, en parallèle si workers > 1, dans l'ordre d'entrée."""
+    if workers <= 1:
+        for batch in batches:
+            yield classify_batch(batch, language_ngrams, n)
+        return
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    with context.Pool(workers, initializer=_init_worker, initargs=(language_ngrams, n)) as pool:
+        yield from pool.imap(_classify_batch_worker, batches, chunksize=chunksize)
+
+def process_file(input_file, language_ngrams, n, batch_size=50, workers=1, chunksize=1):
+    """Traite un fichier d'entrée par lots, éventuellement sur plusieurs processus."""
     start_time = time.time()
     modify = False
     all_lines = []
@@ -117,29 +171,12 @@ def process_file(input_file, language_ngrams, n, batch_size=50):
         all_lines = file.readlines()
 
     results = []
-    for i in range(0, len(all_lines), batch_size):
-        batch = all_lines[i:i + batch_size]
-        batch_results = []
-
-        for line in batch:
-            parts = line.split("\t")
-            if len(parts) != 2:
-                print(f"Skipping malformed line: {line.strip()}")
-                batch_results.append(line)
-                continue
-
-            phrase, true_language = parts[0], parts[1].strip()
-            detected_language = detect_language(phrase, language_ngrams, n)
-
-            if true_language == "??":
-                batch_results.append(f"{phrase}\t{detected_language}\n")
-                modify = True
-            else:
-                batch_results.append(line)
-
+    batches = [all_lines[i:i + batch_size] for i in range(0, len(all_lines), batch_size)]
+    for batch_results, batch_modify in classify_batches(batches, language_ngrams, n, workers, chunksize):
         results.extend(batch_results)
+        modify = modify or batch_modify
         
-        progress = min(100, int((i + len(batch)) / len(all_lines) * 100))
+        progress = min(100, int(len(results) / len(all_lines) * 100))
         elapsed = time.time() - start_time
         estimated_total = elapsed / progress * 100 if progress > 0 else 0
         remaining = estimated_total - elapsed
@@ -163,6 +200,7 @@ def main():
     language_files_directory = "language_files2"
     input_file = "dev.txt"
     n = 3
+    workers = os.cpu_count() or 1
 
     print("Chargement des n-grammes...")
     load_start_time = time.time()
@@ -171,7 +209,7 @@ def main():
     print(f"Chargement des n-grammes terminé en {load_time:.2f} secondes")
 
     print("Traitement du fichier...")
-    process_time = process_file(input_file, language_ngrams, n)
+    process_time = process_file(input_file, language_ngrams, n, workers=workers)
     
     # Calculer et afficher le temps total
     total_time = time.time() - program_start_time
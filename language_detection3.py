@@ -1,44 +1,81 @@
 import os
 import math
-import re
-import unicodedata
-from collections import Counter
-import pickle
+from collections import Counter, deque
 import time
-from functools import lru_cache
-
-# Cache pour le prétraitement de texte
-@lru_cache(maxsize=10000)
-def preprocess_text_cached(line):
-    """Version mise en cache du prétraitement de texte"""
-    line = line.lower()
-    line = unicodedata.normalize("NFKD", line).encode("ascii", "ignore").decode("utf-8")
-    line = re.sub(r"\b\d+\b", " ", line)  
-    line = re.sub(r"[^\w\s']", " ", line)  
-    line = re.sub(r"\s+", " ", line).strip()
-    return line
+import multiprocessing
+import sys
+import argparse
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from array import array
+import json
+import struct
+import numpy as np
+from scipy import sparse
+
+from normalizer import normalize_lines, cached_normalizer
+from artifact_cache import ArtifactCache
+from features import ngrams_from_words, ngram_hash, append_features
+from metrics import metrics
+from result_cache import ResultCache, text_key, content_digest
+
+# Cache pour le prétraitement de texte (couche optionnelle, voir set_preprocess_cache)
+preprocess_text_cached = cached_normalizer(10000)
+
+def set_preprocess_cache(maxsize):
+    """Remplace le cache LRU du prétraitement par un cache de maxsize entrées (0 pour le désactiver)."""
+    global preprocess_text_cached
+    preprocess_text_cached = cached_normalizer(maxsize)
+
+# Cache des scores par texte normalisé (désactivé par défaut, voir set_result_cache)
+result_cache = None
+
+def set_result_cache(maxsize):
+    """Installe un cache des résultats de maxsize entrées (0 pour le désactiver) et le renvoie."""
+    global result_cache
+    result_cache = ResultCache(maxsize) if maxsize else None
+    return result_cache
+
+def _result_cache_metrics():
+    """Jauges du cache des résultats, lues au moment de l'export des mesures."""
+    if result_cache is None:
+        return {}
+    return {"result_cache_hits": result_cache.hits, "result_cache_misses": result_cache.misses,
+            "result_cache_size": len(result_cache), "result_cache_hit_ratio": result_cache.hit_ratio()}
+
+metrics.register_collector(_result_cache_metrics)
 
 def preprocess_text(line):
     """Wrapper pour la fonction mise en cache"""
     return preprocess_text_cached(line)
 
+def normalize_batch(phrases):
+    """
+    Normalise un lot de phrases pour la détection. Avec le cache LRU du
+    prétraitement (voir set_preprocess_cache), chaque phrase passe par le
+    cache, ce qui évite de renettoyer les phrases fréquentes ; sans cache,
+    tout le lot est normalisé en un seul appel à normalize_lines.
+    """
+    if not hasattr(preprocess_text_cached, "cache_info"):
+        return normalize_lines(phrases)
+    before = preprocess_text_cached.cache_info()
+    lines = [preprocess_text_cached(phrase) for phrase in phrases]
+    after = preprocess_text_cached.cache_info()
+    # Des compteurs plutôt que des jauges : ils sont renvoyés par les processus de travail
+    metrics.increment("preprocess_cache_requests_total", after.hits - before.hits, result="hit")
+    metrics.increment("preprocess_cache_requests_total", after.misses - before.misses, result="miss")
+    return lines
+
 def get_most_frequent_words(corpus_file, threshold=0.02, cache_dir="cache"):
     """
     Identifie les mots les plus fréquents avec mise en cache.
     """
-    # Créer le répertoire de cache s'il n'existe pas
-    os.makedirs(cache_dir, exist_ok=True)
-    
-    # Nom du fichier de cache basé sur le nom du fichier corpus et le seuil
-    cache_filename = os.path.join(cache_dir, f"{os.path.basename(corpus_file)}_{threshold}_frequent.pkl")
-    
-    # Vérifier si le cache existe
-    if os.path.exists(cache_filename):
-        try:
-            with open(cache_filename, 'rb') as f:
-                return pickle.load(f)
-        except:
-            pass  # En cas d'erreur, continuer avec le calcul normal
+    # La clé dépend du contenu du corpus : un corpus modifié invalide l'entrée
+    cache = ArtifactCache(cache_dir)
+    key = cache.key("frequent", [corpus_file], threshold=threshold)
+    found, frequent_words = cache.get("frequent", key)
+    if found:
+        return frequent_words
     
     word_counter = Counter()
     total_words = 0
@@ -54,8 +91,7 @@ def get_most_frequent_words(corpus_file, threshold=0.02, cache_dir="cache"):
     frequent_words = {word for word, count in word_counter.items() if count / total_words > threshold}
     
     # Sauvegarder dans le cache
-    with open(cache_filename, 'wb') as f:
-        pickle.dump(frequent_words, f)
+    cache.put("frequent", key, frequent_words)
     
     return frequent_words
 
@@ -63,41 +99,31 @@ def generate_ngrams(corpus_file, n, frequent_words=None, cache_dir="cache"):
     """
     Génère des n-grammes avec mise en cache.
     """
-    # Créer le répertoire de cache s'il n'existe pas
-    os.makedirs(cache_dir, exist_ok=True)
-    
-    # Nom du fichier de cache
-    cache_filename = os.path.join(cache_dir, f"{os.path.basename(corpus_file)}_{n}_ngrams.pkl")
-    
-    # Vérifier si le cache existe
-    if os.path.exists(cache_filename):
-        try:
-            with open(cache_filename, 'rb') as f:
-                return pickle.load(f)
-        except:
-            pass  # En cas d'erreur, continuer avec le calcul normal
+    cache = ArtifactCache(cache_dir)
+    key = cache.key("ngrams", [corpus_file], n=n, frequent_words=frequent_words)
+    found, ngram_counter = cache.get("ngrams", key)
+    if found:
+        return ngram_counter
     
     ngram_counter = Counter()
     
-    # Prétraiter l'intégralité du fichier en une seule fois
-    all_words = []
+    # Fenêtre glissante sur les mots du fichier, encadrés des marqueurs de
+    # début et de fin : le corpus n'est jamais gardé en mémoire en entier
+    window = deque(["<s>"] * (n - 1), maxlen=n)
     with open(corpus_file, 'r', encoding='utf-8') as file:
         for line in file:
-            line = preprocess_text(line)
-            words = [word for word in line.split() if frequent_words is None or word not in frequent_words]
-            all_words.extend(words)
-    
-    # Ajouter les marqueurs de début et fin
-    all_words = ["<s>"] * (n - 1) + all_words + ["</s>"]
-    
-    # Générer tous les n-grammes en une seule passe
-    for i in range(len(all_words) - n + 1):
-        ngram = tuple(all_words[i:i + n])
-        ngram_counter[ngram] += 1
+            for word in preprocess_text(line).split():
+                if frequent_words is not None and word in frequent_words:
+                    continue
+                window.append(word)
+                if len(window) == n:
+                    ngram_counter[tuple(window)] += 1
+    window.append("</s>")
+    if len(window) == n:
+        ngram_counter[tuple(window)] += 1
     
     # Sauvegarder dans le cache
-    with open(cache_filename, 'wb') as f:
-        pickle.dump(ngram_counter, f)
+    cache.put("ngrams", key, ngram_counter)
     
     return ngram_counter
 
@@ -110,7 +136,11 @@ def cosine_similarity(ngram_counter_1, ngram_counter_2):
     if not hasattr(ngram_counter_2, '_magnitude'):
         ngram_counter_2._magnitude = math.sqrt(sum(count ** 2 for count in ngram_counter_2.values()))
     
-    magnitude_1 = math.sqrt(sum(count ** 2 for count in ngram_counter_1.values()))
+    # La norme de la phrase n'est calculée qu'une fois pour toutes les langues candidates
+    if not hasattr(ngram_counter_1, '_magnitude'):
+        ngram_counter_1._magnitude = math.sqrt(sum(count ** 2 for count in ngram_counter_1.values()))
+
+    magnitude_1 = ngram_counter_1._magnitude
     magnitude_2 = ngram_counter_2._magnitude
     
     if magnitude_1 == 0 or magnitude_2 == 0:
@@ -122,44 +152,45 @@ def cosine_similarity(ngram_counter_1, ngram_counter_2):
     
     return dot_product / (magnitude_1 * magnitude_2)
 
+def language_files(directory):
+    """
+    Liste les corpus par langue d'un répertoire sous forme de couples (langue, chemin),
+    dans un ordre stable.
+    """
+    files = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith("_cleaned_ngrams.txt"):
+            files.append((filename.split("_")[0], os.path.join(directory, filename)))
+    return files
+
 def load_language_ngrams(directory, n, cache_dir="cache"):
     """
     Charge les n-grammes pour chaque langue avec mise en cache.
+    Seules les langues dont le corpus a changé sont recalculées : les autres
+    retrouvent leurs n-grammes dans le cache.
     """
-    cache_filename = os.path.join(cache_dir, f"all_languages_{n}_ngrams.pkl")
-    os.makedirs(cache_dir, exist_ok=True)
+    files = language_files(directory)
+    cache = ArtifactCache(cache_dir)
+    key = cache.key("all_ngrams", [path for _, path in files], n=n,
+                    languages=[language for language, _ in files])
     
     # Vérifier si le cache pour toutes les langues existe
-    if os.path.exists(cache_filename):
-        try:
-            with open(cache_filename, 'rb') as f:
-                language_ngrams = pickle.load(f)
-                # Pré-calculer les magnitudes pour la similarité cosinus
-                for lang, ngrams in language_ngrams.items():
-                    ngrams._magnitude = math.sqrt(sum(count ** 2 for count in ngrams.values()))
-                return language_ngrams
-        except:
-            pass  # En cas d'erreur, continuer avec le chargement normal
-    
-    language_ngrams = {}
-    
-    for filename in os.listdir(directory):
-        if filename.endswith("_cleaned_ngrams.txt"):
-            language = filename.split("_")[0]
-            file_path = os.path.join(directory, filename)
-            
+    found, language_ngrams = cache.get("all_ngrams", key)
+    if not found:
+        language_ngrams = {}
+        for language, file_path in files:
             # Identifier les mots fréquents pour filtrer les biais
             frequent_words = get_most_frequent_words(file_path, cache_dir=cache_dir)
             
             # Générer les n-grammes en excluant ces mots
             language_ngrams[language] = generate_ngrams(file_path, n, frequent_words, cache_dir=cache_dir)
-            
-            # Pré-calculer la magnitude pour la similarité cosinus
-            language_ngrams[language]._magnitude = math.sqrt(sum(count ** 2 for count in language_ngrams[language].values()))
+        
+        # Sauvegarder dans le cache
+        cache.put("all_ngrams", key, language_ngrams)
     
-    # Sauvegarder dans le cache
-    with open(cache_filename, 'wb') as f:
-        pickle.dump(language_ngrams, f)
+    # Pré-calculer les magnitudes pour la similarité cosinus
+    for ngrams in language_ngrams.values():
+        ngrams._magnitude = math.sqrt(sum(count ** 2 for count in ngrams.values()))
     
     return language_ngrams
 
@@ -167,51 +198,685 @@ def generate_ngrams_from_sentence(phrase, n, frequent_words=None):
     """
     Génère les n-grammes d'une phrase.
     """
-    words = preprocess_text(phrase).split()
-    words = [word for word in words if frequent_words is None or word not in frequent_words]
-    words = ["<s>"] * (n - 1) + words + ["</s>"]
-    return Counter(tuple(words[i:i + n]) for i in range(len(words) - n + 1))
+    return ngrams_from_words(preprocess_text(phrase).split(), n, frequent_words)
+
+# Format binaire des modèles compilés : en-tête JSON suivi de tableaux alignés
+MODEL_MAGIC = b"LANGID02"
+MODEL_ALIGNMENT = 64
+
+def _align(offset):
+    """Arrondit une position au multiple de MODEL_ALIGNMENT supérieur."""
+    return -(-offset // MODEL_ALIGNMENT) * MODEL_ALIGNMENT
+
+class LanguageModel:
+    """
+    Profils de toutes les langues compilés en index inversé : postings est une
+    matrice creuse CSR (caractéristiques x langues) dont la ligne j liste les
+    couples (langue, poids) de la caractéristique keys[j]. Chaque caractéristique
+    (n-gramme de mots ou de caractères) est identifiée par son hachage et keys
+    contient ces hachages triés. Les poids sont normalisés par langue (norme L2,
+    conservée dans norms), de sorte qu'un produit matriciel donne directement le
+    numérateur de la similarité cosinus, pour un coût proportionnel au nombre de
+    caractéristiques de la phrase et non au nombre de langues.
+    features est la configuration de extract_features ; sa clé "weighting"
+    indique la pondération appliquée aux nombres avant normalisation (voir
+    WEIGHTINGS). Si les poids sont quantifiés (voir compaction.py), scales
+    donne pour chaque langue le facteur qui les ramène aux poids réels.
+    temperature est la température de score_probabilities ajustée sur un jeu
+    étiqueté (voir calibrate_temperature), None si le modèle n'est pas calibré.
+    digest identifie le contenu d'un modèle chargé par load_model (voir
+    result_cache.model_signature), None pour un modèle construit en mémoire.
+    """
+
+    def __init__(self, languages, keys, postings, norms, n, features=None, scales=None, temperature=None):
+        self.languages = languages
+        self.keys = keys
+        self.postings = postings
+        self.norms = norms
+        self.n = n
+        self.features = features
+        self.scales = scales
+        self.temperature = temperature
+        self.digest = None
+
+# Pondérations des caractéristiques calculées à la compilation :
+# - "count" : nombres bruts (similarité cosinus des profils de fréquences) ;
+# - "tfidf" : nombres multipliés par l'IDF lissé entre langues, log((1 + L) / (1 + df)) + 1,
+#   où df est le nombre de langues qui contiennent la caractéristique
+WEIGHTINGS = ("count", "tfidf")
 
-def detect_language(phrase, language_ngrams, n):
+def model_weighting(features):
+    """Pondération d'un modèle d'après sa configuration ("count" si elle n'est pas précisée)."""
+    weighting = (features or {}).get("weighting") or "count"
+    if weighting not in WEIGHTINGS:
+        raise ValueError(f"pondération inconnue : {weighting}")
+    return weighting
+
+def with_weighting(features, weighting):
+    """Configuration features complétée par une pondération (inchangée pour "count")."""
+    if model_weighting({"weighting": weighting}) == "count":
+        return features
+    return dict(features or {}, weighting=weighting)
+
+def inverse_document_frequency(document_frequencies, language_count):
+    """IDF lissé de chaque caractéristique à partir du nombre de langues qui la contiennent."""
+    return np.log((1.0 + language_count) / (1.0 + np.asarray(document_frequencies, dtype=np.float64))) + 1.0
+
+def compile_language_ngrams(language_ngrams, n, features=None):
     """
-    Détecte la langue d'une phrase.
-    Version optimisée qui utilise un tri partiel pour trouver la meilleure correspondance.
+    Compile le dictionnaire {langue: Counter de n-grammes de mots} en un LanguageModel.
+    """
+    feature_counts = {}
+    for language, ngram_counter in language_ngrams.items():
+        feature_counts[language] = {ngram_hash(ngram): count for ngram, count in ngram_counter.items()}
+    return compile_feature_counts(feature_counts, n, features)
+
+def compile_feature_counts(feature_counts, n, features=None):
     """
-    phrase_ngrams = generate_ngrams_from_sentence(phrase, n)
+    Compile le dictionnaire {langue: {identifiant de caractéristique: nombre}},
+    produit par extract_features, en un LanguageModel.
+    """
+    languages = list(feature_counts)
+    rows = []
+    hashes = []
+    data = []
+
+    for row, language in enumerate(languages):
+        counts = feature_counts[language]
+        rows.append(np.full(len(counts), row, dtype=np.int64))
+        hashes.append(np.fromiter(counts.keys(), dtype=np.uint64, count=len(counts)))
+        data.append(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))
+
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+    hashes = np.concatenate(hashes) if hashes else np.zeros(0, dtype=np.uint64)
+    data = np.concatenate(data) if data else np.zeros(0, dtype=np.float64)
+    return compile_arrays(languages, rows, hashes, data, n, features)
+
+def compile_arrays(languages, rows, hashes, data, n, features=None, temperature=None):
+    """
+    Compile des triplets (indice de langue, identifiant, nombre) en un LanguageModel.
+    Les triplets répétés sont additionnés. Pour reconstruire un modèle existant,
+    passer sa temperature afin de conserver sa calibration.
+    """
+    keys = np.unique(hashes)
+
+    matrix = sparse.csr_matrix((data, (rows, np.searchsorted(keys, hashes))), shape=(len(languages), len(keys)))
+    matrix.eliminate_zeros()
+
+    # Pondération discriminante calculée une fois pour toutes : la détection reste une somme pondérée
+    if model_weighting(features) == "tfidf":
+        document_frequencies = np.bincount(matrix.indices, minlength=len(keys))
+        matrix = matrix @ sparse.diags(inverse_document_frequency(document_frequencies, len(languages)))
+
+    # Normalisation L2 de chaque profil (remplace le calcul de _magnitude)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    safe_norms = np.where(norms == 0, 1.0, norms)
+    matrix = sparse.diags(1.0 / safe_norms) @ matrix
+
+    # Index inversé : une ligne de postings par caractéristique
+    postings = matrix.T.tocsr()
+    postings.sort_indices()
+
+    return LanguageModel(languages, keys, postings, norms, n, features, temperature=temperature)
+
+def model_arrays(model):
+    """
+    Inverse de compile_arrays : renvoie les triplets (indice de langue,
+    identifiant, nombre) d'un modèle, les nombres étant retrouvés à partir des
+    poids normalisés, de la norme de chaque langue et, en "tfidf", de l'IDF
+    de chaque caractéristique (recalculé d'après le nombre de ses langues).
+    """
+    postings = model.postings.tocoo()
+    weights = postings.data.astype(np.float64)
+    if model.scales is not None:
+        weights *= np.asarray(model.scales)[postings.col]
+    counts = weights * np.asarray(model.norms)[postings.col]
+    if model_weighting(model.features) == "tfidf":
+        document_frequencies = np.diff(model.postings.indptr)
+        counts /= inverse_document_frequency(document_frequencies, len(model.languages))[postings.row]
+    return postings.col.astype(np.int64), np.asarray(model.keys)[postings.row], counts
+
+def save_model(model, path):
+    """
+    Écrit un LanguageModel dans un fichier binaire plat : un en-tête JSON
+    (langues, n, caractéristiques, position de chaque tableau) suivi des tableaux numpy bruts,
+    alignés pour pouvoir être projetés en mémoire par load_model.
+    """
+    arrays = {
+        "keys": np.ascontiguousarray(model.keys, dtype="<u8"),
+        # Types d'indices choisis par scipy (int32 si possible) pour éviter une copie au chargement
+        "indptr": np.ascontiguousarray(model.postings.indptr),
+        "indices": np.ascontiguousarray(model.postings.indices),
+        "data": np.ascontiguousarray(model.postings.data),
+        "norms": np.ascontiguousarray(model.norms, dtype="<f8"),
+    }
+    if model.scales is not None:
+        arrays["scales"] = np.ascontiguousarray(model.scales, dtype="<f8")
+
+    # Position de chaque tableau, relative au début de la zone de données
+    offset = 0
+    layout = {}
+    for name, array in arrays.items():
+        offset = _align(offset)
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += array.nbytes
+    header = {"n": model.n, "features": model.features, "languages": model.languages,
+              "shape": list(model.postings.shape), "arrays": layout, "digest": content_digest(model)}
+    if getattr(model, "temperature", None) is not None:
+        header["temperature"] = model.temperature
+    header = json.dumps(header).encode("utf-8")
+    data_start = _align(len(MODEL_MAGIC) + 8 + len(header))
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(MODEL_MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(array.tobytes())
+    os.replace(temp_path, path)
+
+def load_model(path, mmap=True):
+    """
+    Charge un modèle écrit par save_model. Avec mmap=True, les tableaux sont
+    projetés en mémoire (numpy.memmap) : le chargement est quasi instantané et
+    les processus qui ouvrent le même fichier partagent les mêmes pages.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MODEL_MAGIC)) != MODEL_MAGIC:
+            raise ValueError(f"{path} n'est pas un modèle compilé")
+        header_length, = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_length))
+    data_start = _align(len(MODEL_MAGIC) + 8 + header_length)
+
+    arrays = {}
+    for name, layout in header["arrays"].items():
+        dtype = np.dtype(layout["dtype"])
+        shape = tuple(layout["shape"])
+        if mmap and np.prod(shape) > 0:
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=data_start + layout["offset"], shape=shape)
+        else:
+            arrays[name] = np.fromfile(path, dtype=dtype, count=int(np.prod(shape)), offset=data_start + layout["offset"]).reshape(shape)
+
+    postings = sparse.csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]),
+                                 shape=tuple(header["shape"]), copy=False)
+    model = LanguageModel(header["languages"], arrays["keys"], postings, arrays["norms"], header["n"],
+                          header.get("features"), arrays.get("scales"), header.get("temperature"))
+    model.digest = header.get("digest")
+    if model.digest is None:
+        # Modèle enregistré sans empreinte : identité du fichier (chemin, taille et date de modification)
+        stat = os.stat(path)
+        model.digest = f"file:{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return model
+
+def load_compiled_model(directory, n, cache_dir="cache", weighting="count"):
+    """
+    Charge le modèle compilé depuis le cache, ou le construit à partir des
+    n-grammes de chaque langue (pondérés selon weighting, voir WEIGHTINGS)
+    et l'enregistre au format binaire.
+    """
+    files = language_files(directory)
+    cache = ArtifactCache(cache_dir)
+    features = with_weighting(None, weighting)
+    params = {"weighting": model_weighting(features)} if features else {}
+    key = cache.key("model", [path for _, path in files], n=n,
+                    languages=[language for language, _ in files], format=MODEL_MAGIC.decode("ascii"), **params)
+    cache_filename = cache.path("model", key, ".model")
+    
+    if os.path.exists(cache_filename):
+        try:
+            model = load_model(cache_filename)
+            cache.touch(cache_filename)
+            cache.record("model", True)
+            return model
+        except (OSError, ValueError, KeyError) as error:
+            print(f"Modèle en cache illisible, reconstruction ({cache_filename}) : {error}", file=sys.stderr)
     
-    # Utiliser une approche en deux phases: d'abord un filtrage rapide, puis un calcul précis
-    # si la phrase est très courte
-    if len(phrase_ngrams) <= 5:
-        # Pour les phrases très courtes, faire un calcul complet
-        similarities = [(language, cosine_similarity(phrase_ngrams, ngram_counter)) 
-                       for language, ngram_counter in language_ngrams.items()]
-        return max(similarities, key=lambda x: x[1])[0]
+    cache.record("model", False)
+    model = compile_language_ngrams(load_language_ngrams(directory, n, cache_dir=cache_dir), n, features)
+    save_model(model, cache_filename)
+    cache.evict(keep=cache_filename)
+    return load_model(cache_filename)
+
+def extract_batch_features(phrases, n, features=None, normalized=False):
+    """
+    Extrait les caractéristiques d'un lot de phrases sous forme de tableaux plats :
+    identifiants, nombres d'occurrences, nombre de caractéristiques par phrase
+    et norme de chaque phrase. Avec normalized, les phrases sont supposées
+    déjà passées par normalize_batch.
+
+    Les identifiants de tout le lot sont écrits dans un seul tableau d'entiers
+    (append_features), puis comptés et réduits en normes par numpy : aucun
+    Counter n'est créé par phrase et chaque norme n'est calculée qu'une fois.
+    """
+    features = features or {}
+    hash_size = features.get("hash_size")
+    buffer = array("Q")
+    raw_lengths = np.zeros(len(phrases), dtype=np.int64)
+
+    # Prétraitement de tout le lot en une fois
+    if normalized:
+        lines = phrases
     else:
-        # Pour les phrases plus longues, trouver le top 3 des langues d'abord
-        top_langs = {}
-        for language, ngram_counter in language_ngrams.items():
-            # Estimation rapide: compter les n-grammes communs
-            common_ngrams = sum(1 for ngram in phrase_ngrams if ngram in ngram_counter)
-            top_langs[language] = common_ngrams
-        
-        # Sélectionner les 3 meilleures langues candidates
-        candidates = sorted(top_langs.items(), key=lambda x: x[1], reverse=True)[:3]
-        
-        # Calculer la similarité cosinus précise uniquement pour ces candidates
-        best_similarity = -1
-        detected_language = None
-        
-        for language, _ in candidates:
-            similarity = cosine_similarity(phrase_ngrams, language_ngrams[language])
-            if similarity > best_similarity:
-                best_similarity = similarity
-                detected_language = language
+        with metrics.timer("stage_seconds", stage="preprocess"):
+            lines = normalize_batch(phrases)
+    with metrics.timer("stage_seconds", stage="features"):
+        for i, line in enumerate(lines):
+            raw_lengths[i] = append_features(buffer, line.split(), n, features)
+
+        ids = np.frombuffer(buffer, dtype=np.uint64) if len(buffer) else np.zeros(0, dtype=np.uint64)
+        if hash_size:
+            ids = ids % np.uint64(hash_size)
+        rows = np.repeat(np.arange(len(phrases)), raw_lengths)
+
+        # Comptage des couples (phrase, identifiant) : tri puis longueur de chaque série
+        order = np.lexsort((ids, rows))
+        ids, rows = ids[order], rows[order]
+        starts = np.flatnonzero(np.concatenate(([True], (ids[1:] != ids[:-1]) | (rows[1:] != rows[:-1])))) \
+            if len(ids) else np.zeros(0, dtype=np.int64)
+        counts = np.diff(np.append(starts, len(ids))).astype(np.float64)
+        hashes, rows = ids[starts], rows[starts]
+        lengths = np.bincount(rows, minlength=len(phrases)).astype(np.int64)
+        norms = np.sqrt(np.bincount(rows, weights=counts ** 2, minlength=len(phrases)))
+
+    return hashes, counts, lengths, norms
+
+def features_to_matrix(hashes, counts, lengths, keys):
+    """
+    Construit la matrice creuse (phrases x caractéristiques) des caractéristiques
+    présentes dans keys (hachages triés) ; les autres sont ignorées.
+    """
+    # Une seule recherche dichotomique pour tous les n-grammes du lot
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    columns = np.searchsorted(keys, hashes)
+    if len(keys):
+        found = keys[np.minimum(columns, len(keys) - 1)] == hashes
+    else:
+        found = np.zeros(len(hashes), dtype=bool)
+
+    return sparse.csr_matrix((counts[found], (rows[found], columns[found])), shape=(len(lengths), len(keys)))
+
+def vectorize_sentences(phrases, model, n, normalized=False):
+    """
+    Transforme une liste de phrases en matrice creuse (phrases x caractéristiques)
+    et renvoie aussi la norme de chaque phrase. Les caractéristiques absentes du
+    modèle ne comptent que dans la norme, comme dans cosine_similarity.
+    """
+    hashes, counts, lengths, norms = extract_batch_features(phrases, n, model.features, normalized)
+    with metrics.timer("stage_seconds", stage="candidates"):
+        return features_to_matrix(hashes, counts, lengths, model.keys), norms
+
+def score_sentences(phrases, model, n):
+    """
+    Calcule la similarité cosinus exacte de chaque phrase avec chaque langue
+    en un seul produit avec l'index inversé. Renvoie un tableau (phrases x langues).
+    Un modèle qui fournit sa propre méthode score (comme IncrementalModel) l'utilise.
+    """
+    metrics.increment("sentences_total", len(phrases))
+    if hasattr(model, "score"):
+        return model.score(phrases, n)
+    if result_cache is not None:
+        return _score_cached(phrases, model, n)
+
+    # Les doublons exacts d'un lot ne sont évalués qu'une fois
+    unique = {}
+    index = [unique.setdefault(phrase, len(unique)) for phrase in phrases]
+    if len(unique) == len(phrases):
+        return _score_unique(phrases, model, n)
+    metrics.increment("duplicate_sentences_total", len(phrases) - len(unique))
+    return _score_unique(list(unique), model, n)[index]
+
+def _score_unique(phrases, model, n, normalized=False):
+    vectors, norms = vectorize_sentences(phrases, model, n, normalized)
+    with metrics.timer("stage_seconds", stage="scoring"):
+        scores = postings_product(vectors, model)
+        norms[norms == 0] = np.inf
+        return scores / norms[:, None]
+
+def _score_cached(phrases, model, n):
+    """
+    score_sentences avec le cache des résultats : les phrases sont normalisées
+    une fois et dédoublonnées sur leur texte normalisé ; les textes déjà vus
+    sont lus dans le cache et les autres sont évalués en un seul appel.
+    """
+    result_cache.bind(model)
+    with metrics.timer("stage_seconds", stage="preprocess"):
+        lines = normalize_batch(phrases)
+    scores = np.empty((len(phrases), len(model.languages)))
+    distinct = {}
+    for i, line in enumerate(lines):
+        distinct.setdefault(text_key(line), (line, []))[1].append(i)
+    # Un échec par texte distinct à évaluer ; toutes les autres lignes sont des réussites
+    missing = {}
+    for key, (line, rows) in distinct.items():
+        row = result_cache.get(key, len(rows))
+        if row is not None:
+            scores[rows] = row
+        else:
+            missing[key] = (line, rows)
+    metrics.increment("result_cache_requests_total", len(phrases) - len(missing), result="hit")
+    metrics.increment("result_cache_requests_total", len(missing), result="miss")
+
+    if missing:
+        computed = _score_unique([line for line, _ in missing.values()], model, n, normalized=True)
+        for (key, (_, rows)), row in zip(missing.items(), computed):
+            scores[rows] = row
+            result_cache.put(key, row)
+    return scores
+
+def postings_product(vectors, model):
+    """
+    Produit vectors @ postings en poids réels (phrases x langues), y compris
+    quand les poids du modèle sont quantifiés.
+    """
+    postings = model.postings
+    if postings.dtype == np.float64 and model.scales is None:
+        return (vectors @ postings).toarray()
+
+    # scipy convertirait tout l'index en float64 à chaque appel :
+    # ne convertir que les lignes des caractéristiques présentes dans le lot
+    columns, inverse = np.unique(vectors.indices, return_inverse=True)
+    vectors = sparse.csr_matrix((vectors.data, inverse, vectors.indptr), shape=(vectors.shape[0], len(columns)))
+    scores = (vectors @ postings[columns].astype(np.float64)).toarray()
+    if model.scales is not None:
+        scores *= np.asarray(model.scales)
+    return scores
+
+def detect_languages(phrases, model, n):
+    """
+    Détecte la langue d'une liste de phrases avec un calcul exact pour toutes les langues.
+    """
+    if not phrases:
+        return []
+    best = score_sentences(phrases, model, n).argmax(axis=1)
+    return [model.languages[index] for index in best]
+
+def detect_language(phrase, model, n):
+    """
+    Détecte la langue d'une phrase.
+    """
+    return detect_languages([phrase], model, n)[0]
+
+def rank_languages(scores, k=3):
+    """
+    Indices et scores des k meilleures colonnes de chaque ligne d'un tableau
+    (phrases x langues), par score décroissant : deux tableaux (phrases x k).
+    """
+    scores = np.asarray(scores)
+    k = max(0, min(k, scores.shape[1] if scores.ndim == 2 else 0))
+    if k == 0 or len(scores) == 0:
+        return np.zeros((len(scores), k), dtype=np.int64), np.zeros((len(scores), k))
+    # Sélection partielle puis tri des seules k meilleures colonnes
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return np.take_along_axis(best, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+def top_languages(scores, languages, k=3):
+    """
+    Renvoie, pour chaque ligne d'un tableau de scores (phrases x langues),
+    la liste des k meilleures langues sous forme de couples (langue, score).
+    """
+    best, best_scores = rank_languages(scores, min(k, len(languages)))
+    return [[(languages[index], float(score)) for index, score in zip(row, row_scores)]
+            for row, row_scores in zip(best, best_scores)]
+
+# Étiquette renvoyée quand aucune langue n'atteint le seuil de rejet
+UNKNOWN_LANGUAGE = "unknown"
+
+# Température de score_probabilities pour un modèle non calibré. Les scores
+# cosinus varient beaucoup d'un modèle à l'autre (autour de 1e-3 pour des
+# trigrammes de mots, plusieurs dixièmes pour des n-grammes de caractères) :
+# sans calibration (voir calibrate_temperature), les probabilités et la
+# confiance qui en découlent ne sont qu'un ordre de grandeur
+DEFAULT_TEMPERATURE = 0.02
+
+def model_temperature(model):
+    """Température ajustée du modèle, ou DEFAULT_TEMPERATURE s'il n'est pas calibré."""
+    temperature = getattr(model, "temperature", None)
+    return temperature if temperature else DEFAULT_TEMPERATURE
+
+def score_probabilities(scores, temperature=DEFAULT_TEMPERATURE):
+    """
+    Convertit des similarités cosinus (phrases x langues) en probabilités par
+    un softmax de scores / temperature : chaque ligne somme à 1.
+    """
+    logits = np.asarray(scores, dtype=np.float64) / temperature
+    if logits.size == 0:
+        return logits
+    logits -= logits.max(axis=1, keepdims=True)
+    probabilities = np.exp(logits)
+    return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+def fit_temperature(scores, labels, temperatures=None):
+    """
+    Choisit la température qui minimise la log-vraisemblance négative des
+    langues de référence (indices de colonnes dans labels) sur un jeu étiqueté.
+    """
+    if temperatures is None:
+        temperatures = np.geomspace(1e-5, 1.0, 101)
+    labels = np.asarray(labels)
+    rows = np.arange(len(labels))
+    losses = [-np.log(score_probabilities(scores, t)[rows, labels] + 1e-300).mean() for t in temperatures]
+    return float(temperatures[int(np.argmin(losses))])
+
+def calibrate_temperature(model, phrases, labels):
+    """
+    Ajuste la température du modèle sur des phrases étiquetées (les étiquettes
+    inconnues du modèle sont ignorées), l'enregistre dans model.temperature
+    (à sauvegarder avec save_model) et la renvoie.
+    """
+    columns = {language: index for index, language in enumerate(model.languages)}
+    known = [(phrase, columns[label]) for phrase, label in zip(phrases, labels) if label in columns]
+    if not known:
+        raise ValueError("aucune phrase étiquetée avec une langue du modèle")
+    scores = score_sentences([phrase for phrase, _ in known], model, model.n)
+    model.temperature = fit_temperature(scores, [column for _, column in known])
+    return model.temperature
+
+class LanguageResult:
+    """
+    Résultat de détection d'une phrase : langue retenue (UNKNOWN_LANGUAGE si
+    rejetée), probabilité et score cosinus de la meilleure langue, et liste
+    des k meilleures langues sous forme de triplets (langue, probabilité, score).
+    """
+
+    def __init__(self, language, probability, score, candidates):
+        self.language = language
+        self.probability = probability
+        self.score = score
+        self.candidates = candidates
+
+    def __repr__(self):
+        return (f"LanguageResult(language={self.language!r}, probability={self.probability:.3f}, "
+                f"score={self.score:.3f})")
+
+class LanguageRanking:
+    """
+    Résultats d'un lot sous forme de tableaux (phrases x k) : indices des
+    langues, probabilités et scores, par ordre décroissant, plus l'étiquette
+    retenue pour chaque phrase. ranking[i] renvoie le LanguageResult de la phrase i.
+    """
+
+    def __init__(self, languages, labels, indices, probabilities, scores):
+        self.languages = languages
+        self.labels = labels
+        self.indices = indices
+        self.probabilities = probabilities
+        self.scores = scores
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, i):
+        candidates = [(self.languages[index], float(probability), float(score))
+                      for index, probability, score in zip(self.indices[i], self.probabilities[i], self.scores[i])]
+        probability, score = (candidates[0][1], candidates[0][2]) if candidates else (0.0, 0.0)
+        return LanguageResult(self.labels[i], probability, score, candidates)
+
+def rank_sentences(phrases, model, n, k=3, threshold=0.0, min_probability=0.0, temperature=None):
+    """
+    Détecte la langue d'une liste de phrases et renvoie un LanguageRanking
+    (k meilleures langues avec probabilités), à partir d'un seul appel à
+    score_sentences. Une phrase dont le meilleur score cosinus est inférieur
+    ou égal à threshold (en particulier sans aucun n-gramme connu), ou dont la
+    meilleure probabilité est inférieure à min_probability, reçoit UNKNOWN_LANGUAGE.
+    Par défaut, la température est celle du modèle (voir model_temperature).
+    """
+    languages = list(model.languages)
+    if not phrases:
+        empty = np.zeros((0, min(k, len(languages))))
+        return LanguageRanking(languages, [], empty.astype(np.int64), empty, empty)
+    scores = score_sentences(phrases, model, n)
+    probabilities = score_probabilities(scores, temperature or model_temperature(model))
+    indices, best_scores = rank_languages(scores, k)
+    best_probabilities = np.take_along_axis(probabilities, indices, axis=1)
+
+    top_scores = scores.max(axis=1)
+    top_probabilities = probabilities.max(axis=1)
+    rejected = (top_scores <= threshold) | (top_probabilities < min_probability)
+    labels = [UNKNOWN_LANGUAGE if reject else languages[index]
+              for reject, index in zip(rejected, scores.argmax(axis=1))]
+    return LanguageRanking(languages, labels, indices, best_probabilities, best_scores)
+
+def detect_language_topk(phrase, model, n, k=3, threshold=0.0, min_probability=0.0, temperature=None):
+    """
+    Détecte la langue d'une phrase et renvoie un LanguageResult (voir rank_sentences).
+    """
+    return rank_sentences([phrase], model, n, k, threshold, min_probability, temperature)[0]
+
+def classify_batch(batch, model, n):
+    """
+    Classe un lot de lignes "phrase\tlangue" et renvoie les lignes résultantes,
+    ainsi qu'un booléen indiquant si au moins une étiquette "??" a été remplacée.
+    """
+    batch_results = []
+    modify = False
+    
+    # Séparer les lignes valides pour les évaluer en un seul produit matriciel
+    parsed = [line.split("\t") for line in batch]
+    phrases = [parts[0] for parts in parsed if len(parts) == 2]
+    detected = iter(detect_languages(phrases, model, n))
+    
+    for line, parts in zip(batch, parsed):
+        if len(parts) != 2:
+            print(f"Skipping malformed line: {line.strip()}", file=sys.stderr)
+            batch_results.append(line)
+            continue
+
+        phrase, true_language = parts[0], parts[1].strip()
+        detected_language = next(detected)
         
-        return detected_language
+        if true_language == "??":
+            batch_results.append(f"{phrase}\t{detected_language}\n")
+            modify = True
+        else:
+            batch_results.append(line)
+            #print(f"Phrase: {phrase}")
+            #print(f"True Language: {true_language}, Detected Language: {detected_language}")
+            #print("=" * 50)
+    
+    return batch_results, modify
 
-def process_file(input_file, language_ngrams, n, batch_size=50):
+# Objets propres à chaque processus de travail (modèle, options), installés une seule fois par processus
+worker_state = {}
+
+def _init_pool_worker(state):
+    worker_state.clear()
+    worker_state.update(state)
+    # Les mesures héritées du processus principal par fork y sont déjà comptées
+    metrics.reset()
+
+def fork_context():
+    """
+    Contexte multiprocessing avec fork si possible : le modèle est alors
+    partagé en lecture seule entre les processus au lieu d'être sérialisé
+    pour chacun d'eux.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("fork" if "fork" in methods else None)
+
+def fork_pool(workers, **state):
+    """Pool de workers processus dont chacun trouve state (modèle, options) dans worker_state."""
+    return fork_context().Pool(workers, initializer=_init_pool_worker, initargs=(state,))
+
+def fork_executor(workers, **state):
+    """Comme fork_pool, sous forme de concurrent.futures.ProcessPoolExecutor."""
+    return ProcessPoolExecutor(workers, mp_context=fork_context(), initializer=_init_pool_worker, initargs=(state,))
+
+def _classify_batches_worker(batches):
+    """
+    Point d'entrée des processus de travail : classe un groupe de lots et
+    renvoie aussi les mesures faites dans le processus et les nouvelles
+    entrées du cache des résultats (None si désactivés).
+    """
+    if result_cache is not None:
+        result_cache.recording = True
+    results = [classify_batch(batch, worker_state["model"], worker_state["n"]) for batch in batches]
+    return (results, metrics.drain() if metrics.enabled else None,
+            result_cache.drain() if result_cache is not None else None)
+
+def classify_batches(batches, model, n, workers=1, chunksize=1):
+    """
+    Classe une séquence (éventuellement paresseuse) de lots, en parallèle si workers > 1.
+    Les résultats sont renvoyés dans l'ordre des lots d'entrée. Le nombre de
+    lots en cours de traitement est borné, ce qui garde une mémoire constante
+    même sur un flux infini.
+    """
+    if workers <= 1:
+        for batch in batches:
+            yield classify_batch(batch, model, n)
+        return
+
+    if result_cache is not None:
+        # Empreinte calculée une fois avant fork plutôt que dans chaque processus
+        result_cache.bind(model)
+    with fork_pool(workers, model=model, n=n) as pool:
+        # Chaque tâche regroupe chunksize lots ; au plus 2 tâches en attente par processus
+        for results, worker_metrics, cache_entries in bounded_imap(pool, _classify_batches_worker,
+                                                                   iter_batches(batches, chunksize), 2 * workers):
+            metrics.merge(worker_metrics)
+            if result_cache is not None:
+                result_cache.merge(cache_entries)
+            yield from results
+
+def bounded_imap(pool, func, tasks, max_pending):
+    """
+    Équivalent de pool.imap (résultats dans l'ordre des tâches) qui ne consomme
+    l'itérable tasks qu'au fur et à mesure, avec au plus max_pending tâches en attente.
+    """
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(func, (task,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+def iter_batches(lines, batch_size):
+    """Découpe paresseusement un itérable de lignes en lots de batch_size lignes."""
+    lines = iter(lines)
+    return iter(lambda: list(islice(lines, batch_size)), [])
+
+def stream_file(input_stream, output_stream, model, n, batch_size=50, workers=1, chunksize=1):
+    """
+    Classe un flux de lignes "phrase\t??" en mémoire constante : les lignes sont
+    lues paresseusement, classées par lots bornés et écrites au fur et à mesure
+    dans output_stream (fichier ou sortie standard). Renvoie le nombre de lignes traitées.
+    """
+    total_lines = 0
+    for batch_results, _ in classify_batches(iter_batches(input_stream, batch_size), model, n, workers, chunksize):
+        output_stream.writelines(batch_results)
+        output_stream.flush()
+        total_lines += len(batch_results)
+    return total_lines
+
+def process_file(input_file, model, n, batch_size=50, workers=1, chunksize=1, progress_interval=1.0):
     """
     Traite un fichier d'entrée par lots pour une meilleure efficacité.
+    Avec workers > 1, les lots sont répartis sur un pool de processus
+    (chunksize lots envoyés à la fois à chaque processus).
     """
     start_time = time.time()
     modify = False
@@ -223,34 +888,17 @@ def process_file(input_file, language_ngrams, n, batch_size=50):
         all_lines = file.readlines()
     
     # Traiter par lots
-    for i in range(0, len(all_lines), batch_size):
-        batch = all_lines[i:i+batch_size]
-        batch_results = []
-        
-        for line in batch:
-            parts = line.split("\t")
-            if len(parts) != 2:
-                print(f"Skipping malformed line: {line.strip()}")
-                batch_results.append(line)
-                continue
-
-            phrase, true_language = parts[0], parts[1].strip()
-            detected_language = detect_language(phrase, language_ngrams, n)
-            
-            if true_language == "??":
-                batch_results.append(f"{phrase}\t{detected_language}\n")
-                modify = True
-            else:
-                batch_results.append(line)
-                #print(f"Phrase: {phrase}")
-                #print(f"True Language: {true_language}, Detected Language: {detected_language}")
-                #print("=" * 50)
-        
+    last_report = 0.0
+    for batch_results, batch_modify in classify_batches(iter_batches(all_lines, batch_size), model, n, workers, chunksize):
         results.extend(batch_results)
+        modify = modify or batch_modify
         
-        # Afficher l'avancement
-        progress = min(100, int((i + len(batch)) / len(all_lines) * 100))
+        # Afficher l'avancement au plus une fois par progress_interval secondes (et à la fin)
         elapsed = time.time() - start_time
+        if elapsed - last_report < progress_interval and len(results) < len(all_lines):
+            continue
+        last_report = elapsed
+        progress = min(100, int(len(results) / len(all_lines) * 100))
         estimated_total = elapsed / progress * 100 if progress > 0 else 0
         remaining = estimated_total - elapsed
         print(f"Progression: {progress}% - Temps écoulé: {elapsed:.2f}s - Temps restant estimé: {remaining:.2f}s")
@@ -269,20 +917,73 @@ def process_file(input_file, language_ngrams, n, batch_size=50):
 def main():
     start_time = time.time()
     
-    # Utilisation du programme
-    language_files_directory = "language_files2"
-    input_file = "test2.txt"
-    n = 3
+    parser = argparse.ArgumentParser(description="Détecte la langue des lignes \"phrase\\t??\" d'un fichier.")
+    parser.add_argument("input_file", nargs="?", default="test2.txt",
+                        help="Fichier d'entrée ('-' pour l'entrée standard en mode flux)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Mode flux : lecture paresseuse et écriture incrémentale dans --output")
+    parser.add_argument("-o", "--output", default="-",
+                        help="Fichier de sortie du mode flux ('-' pour la sortie standard)")
+    parser.add_argument("--directory", default="language_files2", help="Répertoire des corpus par langue")
+    parser.add_argument("--model", help="Modèle compilé (par exemple produit par train.py) à utiliser à la place de --directory")
+    parser.add_argument("-n", type=int, default=3, help="Taille des n-grammes (ignorée avec --model)")
+    parser.add_argument("--weighting", choices=WEIGHTINGS, default="count",
+                        help="Pondération des caractéristiques du modèle construit depuis --directory")
+    parser.add_argument("--batch-size", type=int, default=50, help="Nombre de lignes par lot")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Nombre de processus")
+    parser.add_argument("--chunksize", type=int, default=1, help="Nombre de lots envoyés à la fois à un processus")
+    parser.add_argument("--preprocess-cache", type=int, default=10000,
+                        help="Taille du cache LRU du prétraitement (0 pour le désactiver)")
+    parser.add_argument("--result-cache", type=int, default=100000,
+                        help="Nombre de résultats gardés en cache par texte normalisé (0 pour le désactiver)")
+    parser.add_argument("--result-cache-file", help="Fichier où conserver le cache des résultats entre deux exécutions")
+    parser.add_argument("--metrics", help="Mesurer chaque étape et écrire les mesures dans ce fichier "
+                                          "(JSON si le nom finit par .json, texte Prometheus sinon)")
+    args = parser.parse_args()
+    set_preprocess_cache(args.preprocess_cache)
+    metrics.enabled = bool(args.metrics)
     
-    print("Chargement des n-grammes...")
-    language_ngrams = load_language_ngrams(language_files_directory, n)
-    print(f"Chargement terminé en {time.time() - start_time:.2f} secondes")
+    # En mode flux, la sortie standard est réservée aux résultats
+    log = sys.stderr if args.stream else sys.stdout
+    
+    print("Chargement des n-grammes...", file=log)
+    if args.model:
+        model = load_model(args.model)
+    else:
+        model = load_compiled_model(args.directory, args.n, weighting=args.weighting)
+    n = model.n
+    print(f"Chargement terminé en {time.time() - start_time:.2f} secondes", file=log)
+    cache = set_result_cache(args.result_cache)
+    if cache is not None and args.result_cache_file:
+        loaded = cache.load(args.result_cache_file, model)
+        print(f"{loaded} résultats rechargés depuis {args.result_cache_file}", file=log)
     
     # Traiter le fichier d'entrée
-    process_file(input_file, language_ngrams, n)
+    if args.stream:
+        input_stream = sys.stdin if args.input_file == "-" else open(args.input_file, 'r', encoding='utf-8')
+        output_stream = sys.stdout if args.output == "-" else open(args.output, 'w', encoding='utf-8')
+        try:
+            total_lines = stream_file(input_stream, output_stream, model, n,
+                                      args.batch_size, args.workers, args.chunksize)
+        finally:
+            if input_stream is not sys.stdin:
+                input_stream.close()
+            if output_stream is not sys.stdout:
+                output_stream.close()
+        print(f"{total_lines} lignes traitées", file=log)
+    else:
+        process_file(args.input_file, model, n, args.batch_size, args.workers, args.chunksize)
+    
+    if cache is not None:
+        print(f"Cache des résultats : {cache.hits} réussites, {cache.misses} échecs "
+              f"({100 * cache.hit_ratio():.1f}%)", file=log)
+        if args.result_cache_file:
+            cache.save(args.result_cache_file)
     
     total_time = time.time() - start_time
-    print(f"Temps total d'exécution: {total_time:.2f} secondes")
+    print(f"Temps total d'exécution: {total_time:.2f} secondes", file=log)
+    if args.metrics:
+        metrics.write(args.metrics)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
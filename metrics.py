@@ -0,0 +1,199 @@
+import json
+import time
+import bisect
+import threading
+from contextlib import nullcontext
+
+# Bornes des histogrammes de durée, en secondes (de 10 µs à 10 s)
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+# Contexte vide partagé : un timer désactivé ne coûte qu'un test et un appel
+_NULL_TIMER = nullcontext()
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+class Histogram:
+    """Histogramme cumulatif à bornes fixes (nombre, somme et répartition des observations)."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """Couples (borne, nombre d'observations inférieures ou égales), la dernière borne étant +Inf."""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+class _Timer:
+    """Mesure la durée d'un bloc et l'ajoute à un histogramme."""
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+class Metrics:
+    """
+    Registre de compteurs et d'histogrammes de durée, étiquetés par des
+    paires nom=valeur. Désactivé, chaque appel se réduit au test de enabled.
+    Les collecteurs enregistrés avec register_collector fournissent des
+    jauges calculées au moment de l'export (par exemple les taux de réussite
+    d'un cache LRU). Export au format texte Prometheus ou en JSON.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def timer(self, name, **labels):
+        """Contexte qui mesure la durée du bloc dans l'histogramme name (sans effet si désactivé)."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def register_collector(self, collector):
+        """collector() renvoie un dict {nom: valeur} ou {nom: [(étiquettes, valeur), ...]} de jauges."""
+        self._collectors.append(collector)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def drain(self):
+        """Renvoie les compteurs et histogrammes accumulés puis les remet à zéro (pour les processus de travail)."""
+        with self._lock:
+            state = (self._counters, self._histograms)
+            self._counters, self._histograms = {}, {}
+        return state
+
+    def merge(self, state):
+        """Ajoute les mesures renvoyées par drain() dans un autre processus."""
+        if state is None:
+            return
+        counters, histograms = state
+        with self._lock:
+            for key, value in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, other in histograms.items():
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(other.buckets)
+                histogram.counts = [a + b for a, b in zip(histogram.counts, other.counts)]
+                histogram.count += other.count
+                histogram.sum += other.sum
+
+    def _gauges(self):
+        gauges = []
+        for collector in self._collectors:
+            for name, value in collector().items():
+                if isinstance(value, list):
+                    gauges.extend((name, _label_key(labels), sample) for labels, sample in value)
+                else:
+                    gauges.append((name, (), value))
+        return gauges
+
+    def snapshot(self):
+        """Instantané sérialisable en JSON de toutes les mesures."""
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            histograms = [{"name": name, "labels": dict(labels), "count": histogram.count, "sum": histogram.sum,
+                           "buckets": [[bound if bound != float("inf") else "+Inf", count]
+                                       for bound, count in histogram.cumulative()]}
+                          for (name, labels), histogram in sorted(self._histograms.items())]
+        gauges = [{"name": name, "labels": dict(labels), "value": value}
+                  for name, labels, value in self._gauges()]
+        return {"counters": counters, "histograms": histograms, "gauges": gauges}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """Export au format texte de Prometheus."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+
+        declared = set()
+        def declare(name, kind):
+            if name not in declared:
+                lines.append(f"# TYPE {name} {kind}")
+                declared.add(name)
+
+        for (name, labels), value in counters:
+            declare(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), histogram in histograms:
+            declare(name, "histogram")
+            for bound, count in histogram.cumulative():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', le)])} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        for name, labels, value in self._gauges():
+            declare(name, "gauge")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Écrit un instantané dans path : JSON si le nom finit par .json, texte Prometheus sinon."""
+        content = self.to_json() if path.endswith(".json") else self.to_prometheus()
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+
+# Registre global du processus, désactivé par défaut
+metrics = Metrics()
+
+def enable():
+    metrics.enabled = True
+
+def disable():
+    metrics.enabled = False
@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+
+from language_detection3 import (LanguageModel, load_model, save_model, extract_batch_features, features_to_matrix,
+                                 postings_product, rank_languages)
+from compaction import prune_model, quantize_model, model_nbytes
+from metrics import metrics
+
+# Description d'un modèle découpé : langues, configuration et fichiers
+REGISTRY_FILE = "registry.json"
+INDEX_FILE = "index.model"
+
+def language_profile(model, language_index, columns=None):
+    """
+    Extrait le profil d'une langue d'un modèle compilé, sous forme de LanguageModel
+    à une seule langue. columns est model.postings converti en CSC, à passer
+    pour extraire plusieurs langues sans reconvertir tout l'index à chaque fois.
+    """
+    if columns is None:
+        columns = model.postings.tocsc()
+    start, end = columns.indptr[language_index], columns.indptr[language_index + 1]
+    rows = columns.indices[start:end]
+    postings = sparse.csr_matrix((columns.data[start:end], np.zeros(len(rows), dtype=np.int32),
+                                  np.arange(len(rows) + 1)), shape=(len(rows), 1))
+    scales = None if model.scales is None else np.asarray(model.scales)[[language_index]]
+    return LanguageModel([model.languages[language_index]], np.asarray(model.keys)[rows], postings,
+                         np.asarray(model.norms)[[language_index]], model.n, model.features, scales)
+
+def split_model(model, directory, index_top_k=2000, index_dtype="uint8"):
+    """
+    Découpe un modèle compilé pour LazyModelRegistry : un index de sélection
+    des candidats (les index_top_k caractéristiques les plus fréquentes de
+    chaque langue, quantifiées) et un fichier de profil complet par langue.
+    """
+    os.makedirs(directory, exist_ok=True)
+    index = quantize_model(prune_model(model, top_k=index_top_k), index_dtype)
+    save_model(index, os.path.join(directory, INDEX_FILE))
+
+    profiles = {}
+    columns = model.postings.tocsc()
+    for language_index, language in enumerate(model.languages):
+        profiles[language] = f"{language_index}.model"
+        save_model(language_profile(model, language_index, columns), os.path.join(directory, profiles[language]))
+
+    description = {"languages": list(model.languages), "n": model.n, "features": model.features,
+                   "temperature": getattr(model, "temperature", None), "index": INDEX_FILE, "profiles": profiles}
+    temp_path = os.path.join(directory, f"{REGISTRY_FILE}.tmp")
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(description, f, indent=2)
+    os.replace(temp_path, os.path.join(directory, REGISTRY_FILE))
+
+class LazyModelRegistry:
+    """
+    Modèle découpé par split_model, chargé à la demande. Seul le petit index
+    de sélection est chargé à l'ouverture ; pour chaque phrase, il désigne les
+    candidates langues les plus probables, dont les profils complets sont
+    alors chargés puis gardés en mémoire dans la limite de memory_budget
+    octets, les moins récemment utilisés étant évincés au-delà.
+
+    Les scores des langues candidates sont les similarités cosinus du modèle
+    complet et les autres langues reçoivent 0 : la langue retenue est celle du
+    modèle complet tant qu'elle figure parmi les candidates. Une phrase dont
+    aucune caractéristique n'est dans l'index (phrase courte, n-grammes rares)
+    n'y désigne aucune langue ; elle est alors évaluée avec tous les profils.
+    Comme IncrementalModel, le registre fournit une méthode score utilisée par
+    score_sentences.
+    """
+
+    def __init__(self, directory, memory_budget=256 << 20, candidates=3, mmap=False):
+        with open(os.path.join(directory, REGISTRY_FILE), 'r', encoding='utf-8') as f:
+            description = json.load(f)
+        self.directory = directory
+        self.languages = description["languages"]
+        self.n = description["n"]
+        self.features = description["features"]
+        self.temperature = description.get("temperature")
+        self.memory_budget = memory_budget
+        self.candidates = candidates
+        self.mmap = mmap
+        self.index = load_model(os.path.join(directory, description["index"]), mmap=mmap)
+        self._profile_files = description["profiles"]
+        self._profiles = OrderedDict()
+        self.resident_bytes = 0
+        self.loads = 0
+        self.evictions = 0
+        # Les threads d'un exécuteur partagent le registre
+        self._lock = threading.Lock()
+
+    def profile(self, language_index):
+        """Profil complet d'une langue, chargé si besoin (avec éviction des profils les moins récents)."""
+        with self._lock:
+            return self._profile(language_index)
+
+    def _profile(self, language_index):
+        profile = self._profiles.get(language_index)
+        if profile is not None:
+            self._profiles.move_to_end(language_index)
+            return profile
+
+        language = self.languages[language_index]
+        profile = load_model(os.path.join(self.directory, self._profile_files[language]), mmap=self.mmap)
+        size = model_nbytes(profile)
+        # Le profil demandé reste chargé même s'il dépasse à lui seul le budget
+        while self._profiles and self.resident_bytes + size > self.memory_budget:
+            _, evicted = self._profiles.popitem(last=False)
+            self.resident_bytes -= model_nbytes(evicted)
+            self.evictions += 1
+            metrics.increment("profile_evictions_total")
+        self._profiles[language_index] = profile
+        self.resident_bytes += size
+        self.loads += 1
+        metrics.increment("profile_loads_total", language=language)
+        return profile
+
+    def resident_languages(self):
+        return [self.languages[language_index] for language_index in self._profiles]
+
+    def score(self, phrases, n):
+        """
+        Similarité cosinus (phrases x langues), exacte pour les langues candidates
+        de chaque phrase, et pour toutes les langues si l'index ne désigne aucune candidate.
+        """
+        hashes, counts, lengths, norms = extract_batch_features(phrases, n, self.features)
+        scores = np.zeros((len(phrases), len(self.languages)))
+        if not len(phrases):
+            return scores
+        norms[norms == 0] = np.inf
+
+        # Sélection des candidates avec l'index seul
+        index_scores = postings_product(features_to_matrix(hashes, counts, lengths, self.index.keys), self.index)
+        candidates, _ = rank_languages(index_scores, self.candidates)
+        # Sans aucun score non nul dans l'index, les candidates ne seraient que les
+        # premières langues : ces phrases sont évaluées avec tous les profils
+        # (sauf si elles n'ont aucune caractéristique, leurs scores restant nuls)
+        unranked = (index_scores.max(axis=1) <= 0) & np.isfinite(norms)
+        selected = np.unique(candidates) if not unranked.any() else np.arange(len(self.languages))
+
+        # Un seul produit par langue, pour toutes les phrases qui la retiennent
+        for language_index in selected:
+            rows = np.flatnonzero((candidates == language_index).any(axis=1) | unranked)
+            profile = self.profile(int(language_index))
+            vectors = features_to_matrix(hashes, counts, lengths, profile.keys)[rows]
+            scores[rows, language_index] = postings_product(vectors, profile)[:, 0] / norms[rows]
+        return scores
+
+def open_model(path, memory_budget=256 << 20, candidates=3):
+    """Ouvre un modèle compilé, ou un registre chargé à la demande si path est un répertoire de split_model."""
+    if os.path.isdir(path):
+        return LazyModelRegistry(path, memory_budget, candidates)
+    return load_model(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Découpe un modèle compilé en index de candidats et profils chargés à la demande.")
+    parser.add_argument("model", help="Modèle compilé à découper")
+    parser.add_argument("directory", help="Répertoire de sortie")
+    parser.add_argument("--index-top-k", type=int, default=2000,
+                        help="Nombre de caractéristiques par langue dans l'index de sélection")
+    parser.add_argument("--index-dtype", choices=("float64", "float32", "uint8"), default="uint8",
+                        help="Type des poids de l'index")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    model = load_model(args.model)
+    split_model(model, args.directory, args.index_top_k, args.index_dtype)
+    index_size = os.path.getsize(os.path.join(args.directory, INDEX_FILE))
+    print(f"{len(model.languages)} profils et un index de {index_size / 2**20:.2f} Mo écrits dans "
+          f"{args.directory} en {time.time() - start_time:.2f} secondes", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+# Nombres isolés et ponctuation (sauf l'apostrophe) en une seule expression :
+# les remplacer ensemble donne le même résultat que deux re.sub successifs,
+# car la ponctuation et l'espace sont tous deux des frontières de mot (\b)
+_NUMBER_OR_PUNCTUATION = re.compile(r"\b\d+\b|[^\w\s']")
+
+def fold_text(text):
+    """Minuscules et suppression des accents ; le texte déjà ASCII évite la normalisation Unicode."""
+    text = text.lower()
+    if text.isascii():
+        return text
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("utf-8")
+
+def normalize_text(line):
+    """
+    Nettoyage de texte : minuscule, suppression des accents, des nombres isolés et de la ponctuation.
+    Même résultat que preprocess_text, en deux passes au lieu de six.
+    """
+    return " ".join(_NUMBER_OR_PUNCTUATION.sub(" ", fold_text(line)).split())
+
+def normalize_lines(lines):
+    """
+    Nettoie une liste de lignes en une seule fois : les lignes sont jointes par
+    des sauts de ligne pour ne faire qu'un appel à lower, à la normalisation
+    Unicode et à l'expression régulière pour tout le lot.
+    """
+    if not lines:
+        return []
+    text = "\n".join(lines)
+    # Une ligne contenant elle-même un saut de ligne casserait le découpage
+    if text.count("\n") != len(lines) - 1:
+        return [normalize_text(line) for line in lines]
+    text = _NUMBER_OR_PUNCTUATION.sub(" ", fold_text(text))
+    return [" ".join(line.split()) for line in text.split("\n")]
+
+def cached_normalizer(maxsize=10000):
+    """
+    Renvoie normalize_text enveloppée dans un cache LRU de maxsize entrées
+    (son efficacité se mesure avec cache_info()), ou normalize_text telle quelle si maxsize vaut 0.
+    """
+    if not maxsize:
+        return normalize_text
+    return lru_cache(maxsize=maxsize)(normalize_text)
@@ -0,0 +1,146 @@
+import os
+import json
+import pickle
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+# À incrémenter quand le format du fichier de persistance change
+RESULT_CACHE_VERSION = 1
+
+def text_key(normalized):
+    """Clé (64 bits) d'un texte déjà normalisé."""
+    return int.from_bytes(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), "little")
+
+def content_digest(model):
+    """Empreinte (hexadécimale) des tableaux d'un modèle ; save_model l'enregistre dans l'en-tête."""
+    digest = hashlib.blake2b(digest_size=16)
+    arrays = [model.keys, model.postings.indptr, model.postings.indices, model.postings.data, model.norms]
+    if model.scales is not None:
+        arrays.append(model.scales)
+    for values in arrays:
+        digest.update(np.ascontiguousarray(values).view(np.uint8))
+    return digest.hexdigest()
+
+def model_signature(model):
+    """
+    Empreinte d'un modèle (configuration, langues et contenu), mise en cache sur
+    l'objet : des résultats ne sont jamais réutilisés avec un autre modèle. Pour
+    un modèle chargé par load_model, le contenu est représenté par l'empreinte
+    de son en-tête (ou l'identité de son fichier) : rien n'est relu, ce qui
+    garde un démarrage instantané et les pages partagées entre processus.
+    """
+    signature = getattr(model, "_signature", None)
+    if signature is None:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(json.dumps([model.n, model.features, list(model.languages)], sort_keys=True).encode("utf-8"))
+        content = getattr(model, "digest", None) or content_digest(model)
+        digest.update(content.encode("utf-8"))
+        signature = model._signature = digest.hexdigest()
+    return signature
+
+class ResultCache:
+    """
+    Cache LRU borné des scores (une ligne par langue) déjà calculés, indexé
+    par text_key du texte normalisé : deux lignes qui ne diffèrent que par la
+    casse, les accents, les nombres ou la ponctuation partagent une entrée.
+    Le cache est lié à un seul modèle à la fois (voir bind) ; il peut être
+    enregistré entre deux exécutions avec save et rechargé avec load.
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.signature = None
+        self._entries = OrderedDict()
+        # Dans un processus de travail, les nouvelles entrées sont gardées pour drain()
+        self.recording = False
+        self._new = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def bind(self, model):
+        """Associe le cache à un modèle ; les entrées calculées avec un autre modèle sont oubliées."""
+        signature = model_signature(model)
+        if signature != self.signature:
+            self._entries.clear()
+            self._new = []
+            self.signature = signature
+
+    def get(self, key, requests=1):
+        """
+        Scores enregistrés pour key, ou None. requests est le nombre de lignes
+        du lot qui partagent cette clé : un échec ne compte qu'une fois (une
+        seule évaluation), les autres lignes comptant comme des réussites.
+        """
+        row = self._entries.get(key)
+        if row is None:
+            self.misses += 1
+            self.hits += requests - 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += requests
+        return row
+
+    def put(self, key, row, record=True):
+        self._entries[key] = row
+        self._entries.move_to_end(key)
+        if record and self.recording:
+            self._new.append((key, row))
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def drain(self):
+        """
+        Entrées ajoutées et réussites / échecs comptés depuis le dernier appel,
+        pour les renvoyer d'un processus de travail au processus principal.
+        """
+        state = (self._new, self.hits, self.misses)
+        self._new, self.hits, self.misses = [], 0, 0
+        return state
+
+    def merge(self, state):
+        """Ajoute les entrées et les compteurs renvoyés par drain() dans un autre processus."""
+        if state is None:
+            return
+        entries, hits, misses = state
+        for key, row in entries:
+            self.put(key, row, record=False)
+        self.hits += hits
+        self.misses += misses
+
+    def hit_ratio(self):
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    def save(self, path):
+        """Enregistre les entrées (avec l'empreinte du modèle) de façon atomique."""
+        keys = np.fromiter(self._entries.keys(), dtype=np.uint64, count=len(self._entries))
+        rows = np.array(list(self._entries.values())) if self._entries else np.zeros((0, 0))
+        entry = {"version": RESULT_CACHE_VERSION, "signature": self.signature, "keys": keys, "rows": rows}
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    def load(self, path, model):
+        """
+        Recharge les entrées enregistrées par save si elles ont été calculées avec
+        ce modèle. Renvoie le nombre d'entrées chargées (0 si le fichier est absent,
+        illisible ou d'un autre modèle).
+        """
+        self.bind(model)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return 0
+        if (not isinstance(entry, dict) or entry.get("version") != RESULT_CACHE_VERSION
+                or entry.get("signature") != self.signature):
+            return 0
+        for key, row in zip(entry["keys"].tolist(), entry["rows"]):
+            self.put(key, row, record=False)
+        return min(len(entry["keys"]), self.maxsize)
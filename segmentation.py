@@ -0,0 +1,152 @@
+import re
+import sys
+import math
+import argparse
+
+import numpy as np
+
+from language_detection3 import (features_to_matrix, postings_product, score_probabilities, load_model,
+                                 load_compiled_model, model_temperature, UNKNOWN_LANGUAGE)
+from normalizer import normalize_text
+from features import ngram_hash, char_ngram_hash, char_ngrams_from_words, fold_features
+
+_TOKEN = re.compile(r"\S+")
+
+def tokenize_with_offsets(text):
+    """
+    Mots prétraités du texte (les mêmes que normalize_text(text).split()),
+    chacun avec les positions (début, fin) dans text du fragment d'origine.
+    """
+    words, spans = [], []
+    for match in _TOKEN.finditer(text):
+        for word in normalize_text(match.group()).split():
+            words.append(word)
+            spans.append(match.span())
+    return words, spans
+
+def word_features(words, n, features=None):
+    """
+    Caractéristiques propres à chaque mot : le n-gramme de mots qui se termine
+    sur ce mot (avec les marqueurs <s>, et celui de </s> pour le dernier mot) et
+    ses n-grammes de caractères. La somme sur tous les mots est égale à
+    extract_features(words, n, features).
+    """
+    features = features or {}
+    char_ngrams = features.get("char_ngrams")
+    padded = ["<s>"] * (n - 1) + list(words) + ["</s>"]
+    result = []
+
+    for i, word in enumerate(words):
+        counter = {}
+        if n > 0:
+            ends = [i] if i < len(words) - 1 else [i, i + 1]
+            for end in ends:
+                key = ngram_hash(tuple(padded[end:end + n]))
+                counter[key] = counter.get(key, 0) + 1
+        if char_ngrams:
+            for gram, count in char_ngrams_from_words([word], *char_ngrams).items():
+                key = char_ngram_hash(gram)
+                counter[key] = counter.get(key, 0) + count
+        result.append(fold_features(counter, features.get("hash_size")))
+    return result
+
+def segment_text(text, model, n, window=8, threshold=0.0, temperature=None):
+    """
+    Découpe un texte multilingue en segments de même langue.
+
+    Chaque mot reçoit la langue de la fenêtre de window mots centrée sur lui.
+    La fenêtre glisse d'un mot à la fois : les caractéristiques du mot qui sort
+    sont retirées et celles du mot qui entre ajoutées, ce qui met à jour les
+    produits scalaires avec chaque langue et la norme de la fenêtre sans tout
+    recalculer (temps linéaire en la longueur du texte). Les mots consécutifs
+    de même langue forment des segments ((début, fin), langue, confiance), où
+    les positions sont des indices de caractères dans text et la confiance la
+    probabilité moyenne (voir score_probabilities) de la langue sur le segment.
+    Une fenêtre dont le meilleur score est inférieur ou égal à threshold reçoit UNKNOWN_LANGUAGE.
+    Par défaut, la température est celle du modèle (voir model_temperature).
+    """
+    words, spans = tokenize_with_offsets(text)
+    if not words:
+        return []
+    temperature = temperature or model_temperature(model)
+    window = max(1, min(window, len(words)))
+
+    # Contribution de chaque mot aux produits scalaires avec chaque langue, en un seul produit
+    per_word = word_features(words, n, model.features)
+    lengths = np.array([len(counter) for counter in per_word], dtype=np.int64)
+    hashes = np.fromiter((key for counter in per_word for key in counter), dtype=np.uint64, count=int(lengths.sum()))
+    counts = np.fromiter((count for counter in per_word for count in counter.values()), dtype=np.float64,
+                         count=int(lengths.sum()))
+    contributions = postings_product(features_to_matrix(hashes, counts, lengths, model.keys), model)
+
+    dot_products = np.zeros(len(model.languages))
+    window_counts = {}
+    squared_norm = 0.0
+
+    def update(i, sign):
+        # |x ± c.e|² = |x|² ± 2.c.x[e] + c²
+        nonlocal dot_products, squared_norm
+        for key, count in per_word[i].items():
+            previous = window_counts.get(key, 0)
+            squared_norm += sign * 2 * previous * count + count * count
+            if previous + sign * count:
+                window_counts[key] = previous + sign * count
+            else:
+                del window_counts[key]
+        dot_products += sign * contributions[i]
+
+    for i in range(window):
+        update(i, 1)
+
+    labels = []
+    confidences = []
+    start = 0
+    for i in range(len(words)):
+        # Fenêtre centrée sur le mot i, bornée par les extrémités du texte
+        target = min(max(i - window // 2, 0), len(words) - window)
+        while start < target:
+            update(start, -1)
+            update(start + window, 1)
+            start += 1
+
+        scores = dot_products / math.sqrt(squared_norm) if squared_norm > 0 else np.zeros_like(dot_products)
+        probabilities = score_probabilities(scores[None, :], temperature)[0]
+        best = int(np.argmax(scores))
+        labels.append(UNKNOWN_LANGUAGE if scores[best] <= threshold else model.languages[best])
+        confidences.append(float(probabilities[best]))
+
+    # Regroupement des mots consécutifs de même langue
+    segments = []
+    run_start = 0
+    for i in range(1, len(words) + 1):
+        if i == len(words) or labels[i] != labels[run_start]:
+            confidence = sum(confidences[run_start:i]) / (i - run_start)
+            segments.append(((spans[run_start][0], spans[i - 1][1]), labels[run_start], confidence))
+            run_start = i
+    return segments
+
+def main():
+    parser = argparse.ArgumentParser(description="Découpe chaque ligne d'un texte en segments de même langue.")
+    parser.add_argument("input_file", nargs="?", default="-", help="Fichier texte UTF-8 (- : entrée standard)")
+    parser.add_argument("--model", help="Modèle compilé (sinon construit depuis --directory)")
+    parser.add_argument("--directory", default="language_files2", help="Répertoire des corpus par langue")
+    parser.add_argument("-n", type=int, default=3, help="Taille des n-grammes (ignorée avec --model)")
+    parser.add_argument("--window", type=int, default=8, help="Taille de la fenêtre glissante, en mots")
+    parser.add_argument("--threshold", type=float, default=0.0, help="Score minimal en dessous duquel la langue est inconnue")
+    args = parser.parse_args()
+
+    model = load_model(args.model) if args.model else load_compiled_model(args.directory, args.n)
+    input_stream = sys.stdin if args.input_file == "-" else open(args.input_file, 'r', encoding='utf-8')
+    try:
+        # Une ligne "langue\tconfiance\textrait" par segment, une ligne vide après chaque ligne d'entrée
+        for line in input_stream:
+            line = line.rstrip("\n")
+            for (start, end), language, confidence in segment_text(line, model, model.n, args.window, args.threshold):
+                print(f"{language}\t{confidence:.3f}\t{line[start:end]}")
+            print()
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+from language_detection3 import load_compiled_model
+from model_registry import open_model
+from async_detector import AsyncDetector
+from metrics import metrics
+
+# Codes HTTP utilisés par le service
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                413: "Payload Too Large", 500: "Internal Server Error"}
+
+def format_results(ranked):
+    """Met en forme la réponse JSON pour une liste de classements."""
+    return [{"language": ranking[0][0] if ranking else None,
+             "scores": [{"language": language, "score": score} for language, score in ranking]}
+            for ranking in ranked]
+
+async def handle_request(batcher, method, path, body):
+    """Traite une requête HTTP ; renvoie (code, objet JSON), ou (code, texte) pour /metrics."""
+    if path == "/health":
+        return 200, {"status": "ok", "languages": batcher.model.languages}
+    if path == "/metrics" and metrics.enabled:
+        return 200, metrics.to_prometheus()
+    if path != "/detect":
+        return 404, {"error": "unknown path"}
+    if method != "POST":
+        return 405, {"error": "use POST"}
+
+    try:
+        payload = json.loads(body or b"{}")
+        if "texts" in payload:
+            phrases = payload["texts"]
+        else:
+            phrases = [payload["text"]]
+        k = int(payload.get("k", 3))
+        if not isinstance(phrases, list) or not all(isinstance(phrase, str) for phrase in phrases):
+            raise TypeError("texts must be strings")
+    except (ValueError, KeyError, TypeError) as error:
+        return 400, {"error": f"invalid request: {error}"}
+
+    start_time = time.perf_counter()
+    try:
+        ranked = await batcher.detect(phrases, k)
+    except Exception as error:
+        print(f"Erreur pendant la détection : {error!r}", file=sys.stderr)
+        return 500, {"error": "detection failed"}
+    elapsed = time.perf_counter() - start_time
+    metrics.observe("request_seconds", elapsed)
+    return 200, {"results": format_results(ranked), "elapsed_ms": elapsed * 1000}
+
+async def handle_connection(batcher, reader, writer, max_body):
+    """Lit les requêtes HTTP/1.1 d'une connexion (keep-alive) et y répond."""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            try:
+                method, path, version = request_line.decode("latin-1").split()
+            except ValueError:
+                break
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            try:
+                length = int(headers.get("content-length", 0) or 0)
+            except ValueError:
+                length = -1
+            # Sans longueur valide, le corps ne peut pas être délimité : réponse puis fermeture
+            if length < 0:
+                status, response = 400, {"error": "invalid Content-Length"}
+                body = None
+            elif length > max_body:
+                status, response = 413, {"error": "request too large"}
+                body = None
+            else:
+                body = await reader.readexactly(length) if length else b""
+                status, response = await handle_request(batcher, method, path.split("?", 1)[0], body)
+
+            keep_alive = body is not None and headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+            if isinstance(response, str):
+                content, content_type = response.encode("utf-8"), "text/plain; version=0.0.4"
+            else:
+                content, content_type = json.dumps(response).encode("utf-8"), "application/json"
+            writer.write(f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                         f"Content-Type: {content_type}\r\n"
+                         f"Content-Length: {len(content)}\r\n"
+                         f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + content)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(model, n, host="127.0.0.1", port=8000, unix_socket=None,
+                max_batch=256, max_delay=0.002, max_body=1 << 20, max_queue=1024, executor="thread", workers=1):
+    """Lance le service HTTP/JSON (sur un port TCP ou une socket Unix) jusqu'à son arrêt."""
+    batcher = AsyncDetector(model, n, max_batch, max_delay, max_queue, executor, workers)
+    batcher.start()
+
+    def on_connection(reader, writer):
+        return handle_connection(batcher, reader, writer, max_body)
+
+    if unix_socket:
+        server = await asyncio.start_unix_server(on_connection, path=unix_socket)
+        print(f"Service à l'écoute sur {unix_socket}", file=sys.stderr)
+    else:
+        server = await asyncio.start_server(on_connection, host, port)
+        print(f"Service à l'écoute sur http://{host}:{port}", file=sys.stderr)
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Service de détection de langue (HTTP/JSON).")
+    parser.add_argument("--model", help="Modèle compilé ou registre de model_registry.py à charger (sinon construit depuis --directory)")
+    parser.add_argument("--directory", default="language_files2", help="Répertoire des corpus par langue")
+    parser.add_argument("-n", type=int, default=3, help="Taille des n-grammes (ignorée avec --model)")
+    parser.add_argument("--memory-budget", type=float, default=256,
+                        help="Mémoire maximale des profils chargés d'un registre (Mo)")
+    parser.add_argument("--host", default="127.0.0.1", help="Adresse d'écoute")
+    parser.add_argument("--port", type=int, default=8000, help="Port d'écoute")
+    parser.add_argument("--unix-socket", help="Écouter sur cette socket Unix plutôt qu'en TCP")
+    parser.add_argument("--max-batch", type=int, default=256, help="Nombre maximal de phrases par micro-lot")
+    parser.add_argument("--max-delay", type=float, default=2.0, help="Attente maximale d'un micro-lot (ms)")
+    parser.add_argument("--max-queue", type=int, default=1024, help="Nombre maximal de requêtes en attente de lot")
+    parser.add_argument("--executor", choices=("thread", "process"), default="thread",
+                        help="Évaluer les lots dans un thread ou dans des processus")
+    parser.add_argument("--workers", type=int, default=1, help="Nombre de threads ou de processus de l'exécuteur")
+    parser.add_argument("--metrics", action="store_true", help="Mesurer chaque étape et les exposer sur GET /metrics")
+    args = parser.parse_args()
+    metrics.enabled = args.metrics
+
+    start_time = time.time()
+    model = open_model(args.model, int(args.memory_budget * 2**20)) if args.model else load_compiled_model(args.directory, args.n)
+    print(f"Modèle chargé en {time.time() - start_time:.2f} secondes", file=sys.stderr)
+
+    try:
+        asyncio.run(serve(model, model.n, args.host, args.port, args.unix_socket,
+                          args.max_batch, args.max_delay / 1000, max_queue=args.max_queue,
+                          executor=args.executor, workers=args.workers))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import random
+
+import numpy as np
+
+from benchmark import generate_corpus
+from language_detection3 import score_sentences, postings_product, features_to_matrix, extract_batch_features
+from model_registry import split_model, LazyModelRegistry
+from train import train
+
+def test_registry_matches_full_model(tmp_path):
+    languages, generate = generate_corpus(tmp_path / "train.txt", languages=6, vocabulary=200, sentences=300)
+    model = train(str(tmp_path / "train.txt"), str(tmp_path / "full.model"))
+    # Un petit index : beaucoup de phrases courtes n'y ont aucune caractéristique
+    split_model(model, tmp_path / "registry", index_top_k=50)
+    registry = LazyModelRegistry(tmp_path / "registry", candidates=2)
+
+    rng = random.Random(1)
+    phrases = [generate(rng.choice(languages), rng.randint(1, 6), rng) for _ in range(500)]
+    expected = score_sentences(phrases, model, model.n)
+    actual = score_sentences(phrases, registry, registry.n)
+
+    hashes, counts, lengths, _ = extract_batch_features(phrases, registry.n, registry.features)
+    index_scores = postings_product(features_to_matrix(hashes, counts, lengths, registry.index.keys), registry.index)
+    assert (index_scores.max(axis=1) <= 0).any()
+
+    rows = np.arange(len(phrases))
+    signal = expected.max(axis=1) > 0
+    assert np.array_equal(actual.argmax(axis=1)[signal], expected.argmax(axis=1)[signal])
+    assert np.allclose(actual[rows, actual.argmax(axis=1)], expected[rows, expected.argmax(axis=1)])
@@ -0,0 +1,53 @@
+import bz2
+import gzip
+import lzma
+import random
+
+import numpy as np
+
+from train import train
+
+def write_corpus(path, languages=3, sentences=400, seed=0):
+    """Corpus synthétique "phrase\tlangue" : un vocabulaire par langue, avec des mots fréquents."""
+    rng = random.Random(seed)
+    lines = []
+    for index in range(languages):
+        words = ["".join(rng.choice("abcdefghij") for _ in range(rng.randint(2, 6))) for _ in range(60)]
+        for _ in range(sentences):
+            lines.append(" ".join(rng.choice(words) for _ in range(rng.randint(3, 12))) + f"\tl{index}\n")
+    rng.shuffle(lines)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.writelines(lines)
+    return lines
+
+def write_shards(directory, lines):
+    """Découpe les lignes, dans l'ordre, en trois fichiers compressés différemment (triés par nom)."""
+    third = len(lines) // 3
+    parts = [lines[:third], lines[third:2 * third], lines[2 * third:]]
+    for name, opener, part in zip(("0.txt.gz", "1.txt.bz2", "2.txt.xz"), (gzip.open, bz2.open, lzma.open), parts):
+        with opener(directory / name, 'wt', encoding='utf-8') as file:
+            file.writelines(part)
+    return str(directory / "*.txt.*")
+
+def assert_same_model(expected, actual):
+    assert list(actual.languages) == list(expected.languages)
+    assert np.array_equal(actual.keys, expected.keys)
+    assert np.array_equal(actual.postings.indptr, expected.postings.indptr)
+    assert np.array_equal(actual.postings.indices, expected.postings.indices)
+    assert np.allclose(actual.postings.data, expected.postings.data)
+    assert np.allclose(actual.norms, expected.norms)
+
+def test_spilled_sharded_parallel_training_matches_single_file(tmp_path):
+    lines = write_corpus(tmp_path / "train.txt")
+    shards_dir = tmp_path / "shards"
+    shards_dir.mkdir()
+    pattern = write_shards(shards_dir, lines)
+    features = {"char_ngrams": [1, 3]}
+
+    expected = train(str(tmp_path / "train.txt"), str(tmp_path / "single.model"), n=2, features=features)
+    # Quelques identifiants en mémoire seulement : chaque langue déverse plusieurs fois sur disque
+    actual = train(pattern, str(tmp_path / "sharded.model"), n=2, workers=2, chunk_size=100, features=features,
+                   max_entries=50, temp_dir=str(tmp_path))
+
+    assert len(expected.keys) > 50
+    assert_same_model(expected, actual)
@@ -0,0 +1,335 @@
+import os
+import sys
+import bz2
+import glob
+import gzip
+import lzma
+import time
+import heapq
+import shutil
+import argparse
+import tempfile
+from collections import Counter, deque
+
+import numpy as np
+
+from language_detection3 import compile_arrays, save_model, iter_batches, bounded_imap, fork_pool, WEIGHTINGS, with_weighting
+from features import ngram_hash, char_ngram_hash, char_ngrams_from_words, fold_features
+from normalizer import normalize_lines
+
+# Ouverture des corpus compressés selon leur extension
+COMPRESSED_OPENERS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+# Enregistrement des comptes déversés sur disque par SpillingCounter
+SPILL_RECORD = np.dtype([("key", "<u8"), ("count", "<i8")])
+
+def open_corpus(path, mode='rt'):
+    """Ouvre un fichier de corpus en texte UTF-8, (dé)compressé à la volée (.gz, .bz2, .xz)."""
+    opener = COMPRESSED_OPENERS.get(os.path.splitext(path)[1].lower(), open)
+    return opener(path, mode, encoding='utf-8')
+
+def expand_inputs(patterns):
+    """Liste triée des fichiers désignés par des chemins ou des motifs glob (par exemple "dumps/*.xz")."""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        if not matches:
+            raise FileNotFoundError(f"aucun fichier ne correspond à {pattern}")
+        paths.extend(matches)
+    return paths
+
+def iter_corpus_lines(paths):
+    """Lignes de plusieurs fichiers de corpus, lus l'un après l'autre sans les charger."""
+    for path in paths:
+        with open_corpus(path) as file:
+            yield from file
+
+class FrequentWordSummary:
+    """
+    Résumé de Misra-Gries des mots d'une langue, en mémoire bornée : au plus
+    capacity mots sont suivis, et tout mot dont la part dépasse
+    1 / (capacity + 1) du total y figure forcément. Les candidats sont ensuite
+    recomptés exactement (voir frequent_words_from_file).
+    Avec capacity None, tous les mots sont comptés exactement.
+    """
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity
+        self.counts = Counter()
+        self.total = 0
+
+    def update(self, word_counter):
+        self.total += sum(word_counter.values())
+        self.counts.update(word_counter)
+        if self.capacity is not None and len(self.counts) > self.capacity:
+            # Retirer à tous le (capacity + 1)-ième plus grand nombre
+            cut = heapq.nlargest(self.capacity + 1, self.counts.values())[-1]
+            self.counts = Counter({word: count - cut for word, count in self.counts.items() if count > cut})
+
+    def candidates(self):
+        return set(self.counts)
+
+class SpillingCounter:
+    """
+    Compteur {identifiant: nombre} à mémoire bornée : au-delà de max_entries
+    identifiants en mémoire, les comptes sont déversés sur disque, répartis
+    en partitions par identifiant. arrays() fusionne ensuite une partition à
+    la fois, si bien que la mémoire ne dépend que de max_entries et de la
+    taille d'une partition, pas de celle du corpus.
+    """
+
+    def __init__(self, directory, max_entries=1 << 22, partitions=16):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.partitions = partitions
+        self.counter = Counter()
+        self.spills = 0
+
+    def update(self, counts):
+        self.counter.update(counts)
+        if len(self.counter) > self.max_entries:
+            self.spill()
+
+    def _partition_path(self, partition):
+        return os.path.join(self.directory, f"{partition}.bin")
+
+    def spill(self):
+        """Ajoute les comptes en mémoire aux fichiers de partitions et vide le compteur."""
+        if not self.counter:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        records = np.empty(len(self.counter), dtype=SPILL_RECORD)
+        records["key"] = np.fromiter(self.counter.keys(), dtype=np.uint64, count=len(self.counter))
+        records["count"] = np.fromiter(self.counter.values(), dtype=np.int64, count=len(self.counter))
+        partition_of = records["key"] % np.uint64(self.partitions)
+        for partition in range(self.partitions):
+            with open(self._partition_path(partition), 'ab') as file:
+                records[partition_of == partition].tofile(file)
+        self.counter.clear()
+        self.spills += 1
+
+    def arrays(self, min_count=1):
+        """Identifiants et nombres fusionnés (tableaux uint64 et int64), sans ceux vus moins de min_count fois."""
+        if self.spills == 0:
+            keys = np.fromiter(self.counter.keys(), dtype=np.uint64, count=len(self.counter))
+            counts = np.fromiter(self.counter.values(), dtype=np.int64, count=len(self.counter))
+            keep = counts >= min_count
+            return keys[keep], counts[keep]
+
+        self.spill()
+        all_keys, all_counts = [], []
+        for partition in range(self.partitions):
+            path = self._partition_path(partition)
+            if not os.path.exists(path):
+                continue
+            records = np.fromfile(path, dtype=SPILL_RECORD)
+            os.remove(path)
+            keys, inverse = np.unique(records["key"], return_inverse=True)
+            counts = np.bincount(inverse, weights=records["count"], minlength=len(keys)).astype(np.int64)
+            keep = counts >= min_count
+            all_keys.append(keys[keep])
+            all_counts.append(counts[keep])
+        return np.concatenate(all_keys), np.concatenate(all_counts)
+
+def split_train_line(line):
+    """Sépare une ligne "phrase\tlangue" ; renvoie None si la ligne est mal formée."""
+    parts = line.rsplit('\t', 1)
+    if len(parts) != 2:
+        return None
+    return parts[0].strip(), parts[1].strip()
+
+def preprocess_chunk(lines):
+    """
+    Prétraite un lot de lignes du corpus d'entraînement.
+    Renvoie {langue: (compteur de mots, lignes nettoyées)} pour ce lot.
+    """
+    shard = {}
+    # Ignorer les lignes mal formées
+    pairs = [parts for parts in map(split_train_line, lines) if parts is not None]
+    cleaned_phrases = normalize_lines([phrase for phrase, _ in pairs])
+    for (_, lang), cleaned in zip(pairs, cleaned_phrases):
+        if not cleaned:
+            continue  # Ne pas garder de lignes vides
+        word_counter, cleaned_lines = shard.setdefault(lang, (Counter(), []))
+        word_counter.update(cleaned.split())
+        cleaned_lines.append(cleaned)
+    return shard
+
+def iter_ngrams(lines, n, frequent_words=None):
+    """
+    Parcourt les n-grammes d'une suite de lignes déjà nettoyées, comme si elles
+    formaient un seul texte (mêmes n-grammes que generate_ngrams), avec une
+    fenêtre glissante au lieu de garder tous les mots en mémoire.
+    """
+    window = deque(["<s>"] * (n - 1), maxlen=n)
+
+    for line in lines:
+        for word in line.split():
+            if frequent_words is not None and word in frequent_words:
+                continue
+            window.append(word)
+            if len(window) == n:
+                yield tuple(window)
+
+    window.append("</s>")
+    if len(window) == n:
+        yield tuple(window)
+
+def frequent_words_from_file(path, candidates, total_words, threshold):
+    """Recompte exactement les mots candidats d'un fichier nettoyé et garde ceux dont la part dépasse threshold."""
+    counts = Counter()
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            counts.update(word for word in line.split() if word in candidates)
+    return {word for word, count in counts.items() if count / total_words > threshold}
+
+def build_language_profile(task):
+    """
+    Construit le profil d'une langue à partir de son fichier de lignes nettoyées :
+    n-grammes de mots (sans les mots fréquents) et, si features le demande,
+    n-grammes de caractères de tous les mots. Les comptes passent par un
+    SpillingCounter, la mémoire reste donc bornée quelle que soit la taille
+    du fichier. Renvoie (langue, identifiants, nombres).
+    """
+    language, path, n, candidates, total_words, threshold, features, options = task
+    features = features or {}
+    hash_size = features.get("hash_size")
+    profile = SpillingCounter(path + ".spill", options["max_entries"])
+    frequent_words = frequent_words_from_file(path, candidates, total_words, threshold)
+
+    def add(counter, hash_function):
+        hashed = Counter()
+        for item, count in counter.items():
+            hashed[hash_function(item)] += count
+        profile.update(fold_features(hashed, hash_size))
+
+    if n > 0:
+        # Les n-grammes distincts de chaque lot ne sont hachés qu'une fois
+        with open(path, 'r', encoding='utf-8') as file:
+            batch = Counter()
+            for ngram in iter_ngrams(file, n, frequent_words):
+                batch[ngram] += 1
+                if len(batch) >= options["chunk_size"]:
+                    add(batch, ngram_hash)
+                    batch.clear()
+            add(batch, ngram_hash)
+
+    if features.get("char_ngrams"):
+        with open(path, 'r', encoding='utf-8') as file:
+            for lines in iter_batches(file, options["chunk_size"]):
+                add(char_ngrams_from_words(" ".join(lines).split(), *features["char_ngrams"]), char_ngram_hash)
+
+    keys, counts = profile.arrays(options["min_count"])
+    return language, keys, counts
+
+def train(input_file, output_file, n=3, threshold=0.02, workers=1, chunk_size=10000, features=None,
+          max_entries=1 << 22, min_count=1, temp_dir=None):
+    """
+    Entraîne un modèle en une seule lecture du corpus et l'écrit au format compilé.
+
+    input_file est un chemin, un motif glob ou une liste de ceux-ci ; les
+    fichiers .gz, .bz2 et .xz sont décompressés à la volée.
+
+    1. Les lignes sont lues une seule fois et réparties par lots entre les
+       processus, qui les nettoient et comptent les mots par langue. Les mots
+       de chaque langue sont résumés en mémoire bornée (FrequentWordSummary)
+       et les lignes nettoyées écrites dans un fichier temporaire par langue.
+    2. Chaque langue est ensuite traitée par un processus : filtrage des mots
+       fréquents (seuil threshold, recomptés exactement) puis comptage des
+       n-grammes de mots, et des n-grammes de caractères si features le
+       demande (voir extract_features). Au-delà de max_entries identifiants,
+       les comptes sont déversés sur disque et fusionnés à la fin ; ceux vus
+       moins de min_count fois sont écartés.
+    """
+    start_time = time.time()
+    paths = expand_inputs([input_file] if isinstance(input_file, str) else input_file)
+    # Tout mot dont la part dépasse threshold reste dans un résumé de plus de 1 / threshold mots
+    capacity = max(10000, int(2 / threshold)) if threshold > 0 else None
+    summaries = {}
+    temp_dir = tempfile.mkdtemp(prefix="train_", dir=temp_dir)
+    temp_files = {}
+    options = {"max_entries": max_entries, "min_count": min_count, "chunk_size": chunk_size}
+
+    pool = fork_pool(workers) if workers > 1 else None
+
+    try:
+        # Étape 1 : lecture unique, prétraitement et comptage des mots par lots
+        chunks = iter_batches(iter_corpus_lines(paths), chunk_size)
+        if pool is None:
+            shards = map(preprocess_chunk, chunks)
+        else:
+            shards = bounded_imap(pool, preprocess_chunk, chunks, 2 * workers)
+
+        for shard in shards:
+            for lang, (word_counter, cleaned_lines) in shard.items():
+                if lang not in temp_files:
+                    temp_files[lang] = open(os.path.join(temp_dir, f"{len(temp_files)}.txt"), 'w', encoding='utf-8')
+                    summaries[lang] = FrequentWordSummary(capacity)
+                summaries[lang].update(word_counter)
+                temp_files[lang].write("\n".join(cleaned_lines) + "\n")
+
+        for temp_file in temp_files.values():
+            temp_file.close()
+        print(f"Prétraitement de {len(paths)} fichier(s) terminé en {time.time() - start_time:.2f} secondes "
+              f"({len(temp_files)} langues)", file=sys.stderr)
+
+        # Étape 2 : profils de n-grammes, une langue par tâche
+        tasks = [(lang, temp_files[lang].name, n, summary.candidates(), summary.total, threshold, features, options)
+                 for lang, summary in summaries.items()]
+        if pool is None:
+            profiles = {lang: (keys, counts) for lang, keys, counts in map(build_language_profile, tasks)}
+        else:
+            profiles = {lang: (keys, counts) for lang, keys, counts in pool.imap_unordered(build_language_profile, tasks)}
+        print(f"N-grammes générés en {time.time() - start_time:.2f} secondes", file=sys.stderr)
+    finally:
+        if pool is not None:
+            pool.terminate()
+        for temp_file in temp_files.values():
+            temp_file.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    # Étape 3 : compilation et écriture directe du modèle binaire
+    languages = list(summaries)
+    rows = np.concatenate([np.full(len(profiles[lang][0]), row, dtype=np.int64) for row, lang in enumerate(languages)]
+                          or [np.zeros(0, dtype=np.int64)])
+    hashes = np.concatenate([profiles[lang][0] for lang in languages] or [np.zeros(0, dtype=np.uint64)])
+    data = np.concatenate([profiles[lang][1] for lang in languages] or [np.zeros(0, dtype=np.int64)]).astype(np.float64)
+    model = compile_arrays(languages, rows, hashes, data, n, features)
+    save_model(model, output_file)
+    print(f"Modèle écrit dans {output_file} en {time.time() - start_time:.2f} secondes", file=sys.stderr)
+    return model
+
+def main():
+    parser = argparse.ArgumentParser(description="Entraîne un modèle de détection de langue à partir d'un fichier \"phrase\\tlangue\".")
+    parser.add_argument("input_files", nargs="*", default=["train.txt"],
+                        help="Corpus d'entraînement : fichiers ou motifs glob, éventuellement compressés (.gz, .bz2, .xz)")
+    parser.add_argument("-o", "--output", help="Fichier du modèle compilé (par défaut models/model_<n>.model)")
+    parser.add_argument("-n", type=int, default=3, help="Taille des n-grammes de mots (0 pour les désactiver)")
+    parser.add_argument("--char-ngrams", help="Tailles des n-grammes de caractères, par exemple 1-5")
+    parser.add_argument("--hash-size", type=int, help="Taille de l'espace de hachage des caractéristiques")
+    parser.add_argument("--weighting", choices=WEIGHTINGS, default="count", help="Pondération des caractéristiques")
+    parser.add_argument("--threshold", type=float, default=0.02, help="Seuil de fréquence des mots ignorés")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Nombre de processus")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Nombre de lignes par lot")
+    parser.add_argument("--max-entries", type=int, default=1 << 22,
+                        help="Nombre d'identifiants gardés en mémoire par langue avant déversement sur disque")
+    parser.add_argument("--min-count", type=int, default=1, help="Nombre minimal d'occurrences d'une caractéristique")
+    parser.add_argument("--temp-dir", help="Répertoire des fichiers temporaires (par défaut celui du système)")
+    args = parser.parse_args()
+
+    output_file = args.output or os.path.join("models", f"model_{args.n}.model")
+    output_dir = os.path.dirname(output_file)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    features = None
+    if args.char_ngrams or args.hash_size:
+        features = {"hash_size": args.hash_size}
+        if args.char_ngrams:
+            min_n, _, max_n = args.char_ngrams.partition("-")
+            features["char_ngrams"] = [int(min_n), int(max_n or min_n)]
+    features = with_weighting(features, args.weighting)
+    train(args.input_files, output_file, args.n, args.threshold, args.workers, args.chunk_size, features,
+          args.max_entries, args.min_count, args.temp_dir)
+
+if __name__ == "__main__":
+    main()